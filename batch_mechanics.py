@@ -0,0 +1,202 @@
+"""
+Batched Wild Tic-Tac-Toe: plays many games in lockstep using NumPy arrays.
+
+Boards are (n_games, 9) int8 arrays of cell codes (EMPTY_CODE, X_CODE,
+O_CODE from game_core) laid out in the same order as the flat board
+used by choose_move(). Players are PLAYER1_CODE / PLAYER2_CODE.
+
+Every move played is recorded, so any game can be replayed on the scalar
+WildTictactoeMechanics engine and gives exactly the same result.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from game_core import (
+    CODE_TO_CELL,
+    CODE_TO_PLAYER,
+    EMPTY_CODE,
+    FULL_BOARD_MASK,
+    IS_WINNING_MASK,
+    NO_PLAYER_CODE,
+    O_CODE,
+    PLAYER1_CODE,
+    PLAYER2_CODE,
+    X_CODE,
+    WildTictactoeMechanics,
+)
+
+# Takes a (n, 9) array of boards and the env's rng, returns positions and counter codes
+BatchPolicy = Callable[[np.ndarray, np.random.Generator], Tuple[np.ndarray, np.ndarray]]
+
+_BITS = (1 << np.arange(9)).astype(np.int16)
+_IS_WINNING_MASK = np.array(IS_WINNING_MASK, dtype=bool)
+_NO_MOVE = -1
+
+
+class BatchWildTictactoeMechanics:
+    """
+    Runs n_games games of Wild Tic-Tac-Toe at once.
+
+    Mirrors WildTictactoeMechanics: .reset() and .step() return
+    (boards, rewards, done, info) but every entry is an array with one row
+    per game. Rewards are 1.0 for the move that wins, 0.0 otherwise (use
+    `done` to tell a draw from an ongoing game). Games that are already
+    done ignore the moves passed to .step().
+
+    seed only seeds self.rng, a NumPy Generator that picks the first
+    players and is passed to the policies in play_batch(). The scalar
+    engine draws from the random module instead, so the same seed does
+    not make it play the same games: use .replay() to check a game on it.
+    """
+
+    def __init__(self, n_games: int, seed: Optional[int] = None):
+        self.n_games = n_games
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        n = self.n_games
+        self.x_mask = np.zeros(n, dtype=np.int16)
+        self.o_mask = np.zeros(n, dtype=np.int16)
+        self.player_move = self.rng.integers(0, 2, size=n, dtype=np.int8)
+        self.first_player = self.player_move.copy()
+        self.done = np.zeros(n, dtype=bool)
+        self.winner = np.full(n, NO_PLAYER_CODE, dtype=np.int8)
+        self.positions = np.full((n, 9), _NO_MOVE, dtype=np.int8)
+        self.counters = np.full((n, 9), _NO_MOVE, dtype=np.int8)
+        self.n_plies = 0
+        return (
+            self.board,
+            np.zeros(n, dtype=np.float32),
+            self.done.copy(),
+            {"player_move": self.player_move.copy()},
+        )
+
+    @property
+    def board(self) -> np.ndarray:
+        board = np.zeros((self.n_games, 9), dtype=np.int8)
+        board[(self.x_mask[:, None] & _BITS) != 0] = X_CODE
+        board[(self.o_mask[:, None] & _BITS) != 0] = O_CODE
+        return board
+
+    def step(
+        self, positions: np.ndarray, counters: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        """
+        Plays one move in every game that is not done.
+
+        positions: (n_games,) ints 0 -> 8, counters: (n_games,) X_CODE or O_CODE.
+        """
+        assert not self.done.all(), "All games are done. Call reset() before taking further steps."
+        positions = np.asarray(positions, dtype=np.int8)
+        counters = np.asarray(counters, dtype=np.int8)
+        active = ~self.done
+        bits = _BITS[np.where(active, positions, 0)]
+
+        assert not np.any(
+            ((self.x_mask | self.o_mask) & bits)[active]
+        ), "You moved onto a square that already has a counter on it!"
+        is_x = active & (counters == X_CODE)
+        is_o = active & (counters == O_CODE)
+        assert np.array_equal(is_x | is_o, active), "Counters must be X_CODE or O_CODE"
+
+        self.x_mask[is_x] |= bits[is_x]
+        self.o_mask[is_o] |= bits[is_o]
+        self.positions[active, self.n_plies] = positions[active]
+        self.counters[active, self.n_plies] = counters[active]
+        self.n_plies += 1
+
+        won = active & (_IS_WINNING_MASK[self.x_mask] | _IS_WINNING_MASK[self.o_mask])
+        drawn = active & ~won & ((self.x_mask | self.o_mask) == FULL_BOARD_MASK)
+        self.winner[won] = self.player_move[won]
+        self.done |= won | drawn
+        self.player_move[active] ^= 1
+
+        rewards = won.astype(np.float32)
+        info = {
+            "player_move": np.where(self.done, NO_PLAYER_CODE, self.player_move).astype(np.int8),
+            "winner": self.winner.copy(),
+        }
+        return self.board, rewards, self.done.copy(), info
+
+    def replay(self, game: int) -> Tuple[List[str], Optional[float], bool, Dict]:
+        """
+        Replays the moves of one game on the scalar engine.
+
+        Returns what the scalar engine's last .step() returned.
+        """
+        env = WildTictactoeMechanics()
+        result = env.reset()
+        env.player_move = CODE_TO_PLAYER[self.first_player[game]]
+        for position, counter in zip(self.positions[game], self.counters[game]):
+            if position == _NO_MOVE:
+                break
+            result = env.step(int(position), CODE_TO_CELL[counter])
+        return result
+
+
+def batch_robot_choose_move(
+    boards: np.ndarray, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched equivalent of robot_choose_move(): a uniformly random empty
+    square and a uniformly random counter for every board.
+    """
+    empty = boards == EMPTY_CODE
+    n_empty = empty.sum(axis=1)
+    choice = (rng.random(len(boards)) * n_empty).astype(np.int64)
+    positions = np.argmax(np.cumsum(empty, axis=1) > choice[:, None], axis=1).astype(np.int8)
+    counters = rng.choice(np.array([O_CODE, X_CODE], dtype=np.int8), size=len(boards))
+    return positions, counters
+
+
+def batch_policy(choose_move: Callable, value_function: Optional[Dict] = None) -> BatchPolicy:
+    """Wraps a scalar choose_move(board, value_function) so it can play batched games."""
+
+    def policy(boards: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        positions = np.empty(len(boards), dtype=np.int8)
+        counters = np.empty(len(boards), dtype=np.int8)
+        for i, row in enumerate(boards):
+            position, counter = choose_move([CODE_TO_CELL[code] for code in row], value_function)
+            positions[i] = position
+            counters[i] = X_CODE if counter == CODE_TO_CELL[X_CODE] else O_CODE
+        return positions, counters
+
+    return policy
+
+
+def play_batch(
+    n_games: int,
+    player1_policy: BatchPolicy,
+    player2_policy: BatchPolicy = batch_robot_choose_move,
+    seed: Optional[int] = None,
+) -> BatchWildTictactoeMechanics:
+    """
+    Plays n_games to completion and returns the finished env.
+
+    The first player of each game is random. Results are in env.winner.
+
+    >>> env = play_batch(1000, batch_robot_choose_move, seed=0)
+    >>> bool(env.done.all())
+    True
+    >>> replays = [env.replay(i) for i in range(1000)]
+    >>> all(done for _, _, done, _ in replays)
+    True
+    >>> all(
+    ...     info["winner"] == (CODE_TO_PLAYER[w] if w != NO_PLAYER_CODE else None)
+    ...     for (_, _, _, info), w in zip(replays, env.winner)
+    ... )
+    True
+    """
+    env = BatchWildTictactoeMechanics(n_games, seed)
+    boards, _, done, info = env.reset()
+    positions = np.zeros(n_games, dtype=np.int8)
+    counters = np.zeros(n_games, dtype=np.int8)
+    while not done.all():
+        for player, policy in ((PLAYER1_CODE, player1_policy), (PLAYER2_CODE, player2_policy)):
+            to_move = np.flatnonzero(~done & (info["player_move"] == player))
+            if len(to_move):
+                positions[to_move], counters[to_move] = policy(boards[to_move], env.rng)
+        boards, _, done, info = env.step(positions, counters)
+    return env
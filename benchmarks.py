@@ -0,0 +1,330 @@
+"""
+Benchmarks for the engine, training and move selection hot paths.
+
+Run the suite and write the results as JSON:
+
+    python benchmarks.py run --output bench.json
+
+Compare a run against a stored baseline, exiting with an error if any
+benchmark is more than --tolerance (default 10%) worse:
+
+    python benchmarks.py compare baseline.json bench.json
+
+Each result is a dict of metrics. Metrics ending in "_per_second" are
+better when higher, all other metrics (times) are better when lower.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import pickle
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from game_core import WildTictactoeMechanics, robot_choose_move
+
+Results = Dict[str, Dict[str, float]]
+
+
+def _best_seconds_per_call(
+    function: Callable[[], object], n_calls: int, repeat: int = 5
+) -> float:
+    """Best average time of one call to function over repeat runs of n_calls calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / n_calls)
+    return best
+
+
+def _per_call(seconds: float) -> Dict[str, float]:
+    return {"us_per_call": seconds * 1e6, "calls_per_second": 1 / seconds}
+
+
+def _random_games(n_games: int) -> List[List[Tuple[int, str]]]:
+    """Move sequences of robot_choose_move games, played until the game ends."""
+    games = []
+    for _ in range(n_games):
+        env = WildTictactoeMechanics()
+        observation, _, done, _ = env.reset()
+        moves = []
+        while not done:
+            position, counter = robot_choose_move(observation)
+            observation, _, done, _ = env.step(position, counter)
+            moves.append((position, counter))
+        games.append(moves)
+    return games
+
+
+def bench_engine(n_games: int = 2000) -> Results:
+    random.seed(0)
+    games = _random_games(n_games)
+    n_steps = sum(len(game) for game in games)
+    env = WildTictactoeMechanics()
+
+    def play_all():
+        for moves in games:
+            env.reset()
+            for position, counter in moves:
+                env.step(position, counter)
+
+    def reset():
+        env.reset()
+
+    def check_winner():
+        env._check_winner()
+
+    play_seconds = _best_seconds_per_call(play_all, 1)
+    reset_seconds = _best_seconds_per_call(reset, 20000)
+    # Step time excludes the reset at the start of each game
+    step_seconds = (play_seconds - reset_seconds * n_games) / n_steps
+    env.reset()
+    env.step(4, "X")
+    return {
+        "engine.step": _per_call(step_seconds),
+        "engine.reset": _per_call(reset_seconds),
+        "engine._check_winner": _per_call(_best_seconds_per_call(check_winner, 50000)),
+    }
+
+
+def bench_helpers() -> Results:
+    from main import copy_board, valid_moves
+
+    board = ["X", " ", "O", " ", " ", " ", "X", " ", " "]
+    env = WildTictactoeMechanics()
+    env.board = [board[0:3], board[3:6], board[6:9]]
+    return {
+        "valid_moves": _per_call(_best_seconds_per_call(lambda: valid_moves(board), 20000)),
+        "copy_board": _per_call(_best_seconds_per_call(lambda: copy_board(env), 5000)),
+    }
+
+
+def bench_training() -> Results:
+    from main import train
+
+    start = time.perf_counter()
+    value_function = train(WildTictactoeMechanics())
+    train_seconds = time.perf_counter() - start
+
+    results = {"train": {"seconds": train_seconds}}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dict.pkl")
+        start = time.perf_counter()
+        with open(path, "wb") as f:
+            pickle.dump(value_function, f)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            pickle.load(f)
+        load_seconds = time.perf_counter() - start
+        results["pickle"] = {
+            "save_seconds": save_seconds,
+            "load_seconds": load_seconds,
+            "bytes": os.path.getsize(path),
+        }
+    return results
+
+
+def bench_choose_move(n_moves: int = 2000) -> Results:
+    from main import choose_move, train
+    from policy_table import PolicyAgent, export_policy
+
+    value_function = train(WildTictactoeMechanics())
+    random.seed(1)
+    boards = []
+    for moves in _random_games(n_moves // 4):
+        env = WildTictactoeMechanics()
+        for position, counter in moves[:-1]:
+            observation, _, _, _ = env.step(position, counter)
+            boards.append(observation)
+
+    latencies = []
+    for board in boards[:n_moves]:
+        start = time.perf_counter()
+        choose_move(board, value_function)
+        latencies.append(time.perf_counter() - start)
+    results = {"choose_move": _latencies(latencies)}
+
+    agent = PolicyAgent(export_policy(value_function), fallback=choose_move)
+    latencies = []
+    for board in boards[:n_moves]:
+        start = time.perf_counter()
+        agent.choose_move(board, value_function)
+        latencies.append(time.perf_counter() - start)
+    results["policy_choose_move"] = _latencies(latencies)
+    return results
+
+
+def _latencies(latencies: List[float]) -> Dict[str, float]:
+    latencies_us = np.array(latencies) * 1e6
+    return {
+        "p50_us": float(np.percentile(latencies_us, 50)),
+        "p99_us": float(np.percentile(latencies_us, 99)),
+        "moves_per_second": len(latencies) / float(np.sum(latencies)),
+    }
+
+
+def bench_nxn(sizes: Tuple[int, ...] = (3, 4, 5), k: int = 3, n_games: int = 500) -> Results:
+    """Engine speed, and solver time and memory, as the board grows (k in a row to win)."""
+    from nxn_mechanics import NxNWildTictactoeMechanics
+    from nxn_solver import MAX_SQUARES, solve_nxn
+
+    results = {}
+    for size in sizes:
+        random.seed(0)
+        env = NxNWildTictactoeMechanics(size, k)
+        n_steps = 0
+        start = time.perf_counter()
+        for _ in range(n_games):
+            observation, _, done, _ = env.reset()
+            while not done:
+                observation, _, done, _ = env.step(*robot_choose_move(observation))
+                n_steps += 1
+        results[f"nxn.{size}x{size}.step"] = _per_call((time.perf_counter() - start) / n_steps)
+
+        if size * size > MAX_SQUARES:
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            solution = solve_nxn(size, k, directory=directory)
+            results[f"nxn.{size}x{size}.solve"] = {
+                "seconds": solution.seconds,
+                "peak_bytes": solution.peak_bytes,
+                "table_bytes": solution.values.nbytes + solution.distances.nbytes,
+                "boards_evaluated": solution.n_evaluated,
+            }
+            del solution
+    return results
+
+
+def bench_parallel(processes: Tuple[int, ...] = (1, 2, 4)) -> Results:
+    """
+    value_iteration() against parallel_value_iteration() on the 3x3 state
+    space, the only one the parallel version takes, as processes are added.
+    cpu_count in the metadata says how many of them could run at once.
+    """
+    from state_space import get_state_space
+    from training import parallel_value_iteration, value_iteration
+
+    space = get_state_space()
+    start = time.perf_counter()
+    value_iteration(space)
+    serial_seconds = time.perf_counter() - start
+
+    results = {"parallel.serial": {"seconds": serial_seconds}}
+    for n_processes in processes:
+        start = time.perf_counter()
+        parallel_value_iteration(space, processes=n_processes)
+        results[f"parallel.{n_processes}"] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+BENCHMARKS = {
+    "engine": bench_engine,
+    "helpers": bench_helpers,
+    "training": bench_training,
+    "choose_move": bench_choose_move,
+    "nxn": bench_nxn,
+    "parallel": bench_parallel,
+}
+
+
+def _metadata() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": str(os.cpu_count()),
+        "git_commit": commit,
+    }
+
+
+def run(names: List[str]) -> Dict:
+    results: Results = {}
+    # Keep anything the benchmarked code prints out of JSON written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in names:
+            results.update(BENCHMARKS[name]())
+    return {"metadata": _metadata(), "results": results}
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_second")
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List[str]:
+    """
+    Returns a line for every metric more than tolerance worse than the baseline.
+
+    >>> baseline = {"results": {"train": {"seconds": 1.0}}}
+    >>> compare(baseline, {"results": {"train": {"seconds": 1.05}}})
+    []
+    >>> compare(baseline, {"results": {"train": {"seconds": 2.0}}})
+    ['train.seconds: 1 -> 2 (+100.0% worse)']
+    """
+    regressions = []
+    for name, metrics in baseline["results"].items():
+        for metric, old in metrics.items():
+            new = current["results"].get(name, {}).get(metric)
+            if new is None or old == 0:
+                continue
+            change = (old - new) / old if higher_is_better(metric) else (new - old) / old
+            if change > tolerance:
+                regressions.append(
+                    f"{name}.{metric}: {old:.4g} -> {new:.4g} (+{change:.1%} worse)"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default=None, help="JSON file to write (default stdout)")
+    run_parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    run_parser.add_argument("--baseline", default=None, help="also compare against this JSON")
+    run_parser.add_argument("--tolerance", type=float, default=0.1)
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.only)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        baseline_path = args.baseline
+    else:
+        with open(args.current) as f:
+            report = json.load(f)
+        baseline_path = args.baseline
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            found = compare(json.load(f), report, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
@@ -0,0 +1,291 @@
+"""
+Plays agents against each other across a pool of worker processes.
+
+Games are played in pairs, each agent starting one game of every pair, as in
+the competition (see README.md). Each chunk of games a worker plays is seeded
+from one SeedSequence, so results do not depend on how the work is split.
+
+Evaluate a saved dictionary against the random robot with:
+
+    python evaluation.py SCORPIONS --games 100000
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game_core import Player, WildTictactoeMechanics, load_dictionary, robot_choose_move
+
+
+class Agent(NamedTuple):
+    """An agent is a choose_move(board, value_function) function and its value function."""
+
+    name: str
+    choose_move: Callable[[List[str], Optional[Mapping]], Tuple[int, str]]
+    value_function: Optional[Mapping] = None
+
+
+def _robot_move(board: List[str], value_function: Optional[Mapping]) -> Tuple[int, str]:
+    return robot_choose_move(board)
+
+
+ROBOT = Agent("robot", _robot_move)
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+def play_game(agent: Agent, opponent: Agent, agent_starts: bool) -> int:
+    """Plays one game and returns WIN, DRAW or LOSS for agent."""
+    game = WildTictactoeMechanics()
+    observation, reward, done, info = game.reset()
+    game.player_move = Player.Player1 if agent_starts else Player.Player2
+    while not done:
+        mover = agent if game.player_move == Player.Player1 else opponent
+        position, counter = mover.choose_move(observation, mover.value_function)
+        observation, reward, done, info = game.step(position, counter)
+    if info["winner"] is None:
+        return DRAW
+    return WIN if info["winner"] == Player.Player1 else LOSS
+
+
+def wilson_interval(successes: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """Wilson score confidence interval for a proportion (95% by default).
+
+    >>> low, high = wilson_interval(50, 100)
+    >>> round(low, 3), round(high, 3)
+    (0.404, 0.596)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+class MatchResult(NamedTuple):
+    """Results of agent against opponent, from agent's point of view."""
+
+    agent: str
+    opponent: str
+    wins: int
+    draws: int
+    losses: int
+    seconds: float
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else math.inf
+
+    def rate(self, outcome: int) -> Tuple[float, Tuple[float, float]]:
+        """Fraction of games with outcome (WIN, DRAW or LOSS) and its 95% confidence interval."""
+        count = {WIN: self.wins, DRAW: self.draws, LOSS: self.losses}[outcome]
+        return count / max(self.games, 1), wilson_interval(count, self.games)
+
+    def summary(self) -> str:
+        lines = [f"{self.agent} vs {self.opponent}: {self.games} games"]
+        for label, outcome in (("win", WIN), ("draw", DRAW), ("loss", LOSS)):
+            rate, (low, high) = self.rate(outcome)
+            lines.append(f"  {label:<5} {rate:7.2%}  (95% CI {low:.2%} - {high:.2%})")
+        lines.append(f"  {self.games_per_second:,.0f} games/s over {self.seconds:.1f}s")
+        return "\n".join(lines)
+
+
+# Agents are sent to each worker once, when the pool starts
+_worker_agents: Sequence[Agent] = ()
+
+
+def _init_worker(agents: Sequence[Agent]) -> None:
+    global _worker_agents
+    _worker_agents = agents
+
+
+def _seed(seed: int) -> None:
+    # The engine and robot_choose_move use the random module, agents may use numpy
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+
+
+def _play_pairs(task: Tuple[int, int, int, int]) -> Tuple[int, int, int]:
+    """Plays n_pairs of games between two of the worker's agents."""
+    agent_index, opponent_index, n_pairs, seed = task
+    _seed(seed)
+    agent, opponent = _worker_agents[agent_index], _worker_agents[opponent_index]
+    outcomes = {WIN: 0, DRAW: 0, LOSS: 0}
+    for _ in range(n_pairs):
+        outcomes[play_game(agent, opponent, agent_starts=True)] += 1
+        outcomes[play_game(agent, opponent, agent_starts=False)] += 1
+    return outcomes[WIN], outcomes[DRAW], outcomes[LOSS]
+
+
+def _spawn_seeds(seed: int, n: int) -> List[int]:
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def _run(
+    tasks: List, agents: Sequence[Agent], function: Callable, processes: Optional[int]
+) -> List:
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(tasks) == 1:
+        _init_worker(agents)
+        return [function(task) for task in tasks]
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(agents,)) as pool:
+        return pool.map(function, tasks)
+
+
+def evaluate(
+    agent: Agent,
+    opponent: Agent = ROBOT,
+    n_games: int = 10000,
+    processes: Optional[int] = None,
+    seed: int = 0,
+    games_per_task: int = 1000,
+) -> MatchResult:
+    """
+    Plays n_games (rounded up to an even number) of agent against opponent.
+
+    >>> result = evaluate(ROBOT, ROBOT, n_games=200, processes=1)
+    >>> result.games
+    200
+    """
+    n_pairs = math.ceil(n_games / 2)
+    pairs_per_task = max(1, games_per_task // 2)
+    task_sizes = [pairs_per_task] * (n_pairs // pairs_per_task)
+    if n_pairs % pairs_per_task:
+        task_sizes.append(n_pairs % pairs_per_task)
+    seeds = _spawn_seeds(seed, len(task_sizes))
+    tasks = [(0, 1, size, task_seed) for size, task_seed in zip(task_sizes, seeds)]
+
+    start = time.perf_counter()
+    results = _run(tasks, (agent, opponent), _play_pairs, processes)
+    wins, draws, losses = (sum(counts) for counts in zip(*results))
+    return MatchResult(agent.name, opponent.name, wins, draws, losses, time.perf_counter() - start)
+
+
+def _play_match(task: Tuple[int, int, int, int, int]) -> Tuple[int, int]:
+    """
+    Knockout match: pairs of games, then sudden-death pairs while tied.
+
+    Returns (winner index, the winner's net game wins).
+    """
+    index_1, index_2, n_pairs, max_sudden_death_pairs, seed = task
+    _seed(seed)
+    agent_1, agent_2 = _worker_agents[index_1], _worker_agents[index_2]
+    score = 0
+    pairs_played = 0
+    max_pairs = n_pairs + max_sudden_death_pairs
+    while pairs_played < n_pairs or (score == 0 and pairs_played < max_pairs):
+        score += play_game(agent_1, agent_2, agent_starts=True)
+        score += play_game(agent_1, agent_2, agent_starts=False)
+        pairs_played += 1
+    if score == 0:
+        # Still tied after every sudden-death pair: decide on a seeded coin toss
+        score = random.choice([WIN, LOSS])
+    return (index_1 if score > 0 else index_2), abs(score)
+
+
+class KnockoutRound(NamedTuple):
+    # (agent, opponent, winner, net game wins of the winner) for each match
+    matches: List[Tuple[str, str, str, int]]
+    byes: List[str]
+
+
+def knockout(
+    agents: Sequence[Agent],
+    pairs_per_match: int = 1,
+    max_sudden_death_pairs: int = 50,
+    processes: Optional[int] = None,
+    seed: int = 0,
+) -> Tuple[str, List[KnockoutRound]]:
+    """
+    Runs a knockout tournament; the matches of each round are played in parallel.
+
+    Returns the name of the winner and the results of every round.
+
+    >>> winner, rounds = knockout([ROBOT, ROBOT._replace(name="robot 2")], processes=1)
+    >>> winner in ("robot", "robot 2"), len(rounds)
+    (True, 1)
+    """
+    remaining = list(range(len(agents)))
+    rounds = []
+    round_seeds = np.random.SeedSequence(seed)
+    while len(remaining) > 1:
+        paired = remaining[: len(remaining) // 2 * 2]
+        byes = remaining[len(paired) :]
+        seeds = [int(s.generate_state(1)[0]) for s in round_seeds.spawn(len(paired) // 2)]
+        tasks = [
+            (paired[i], paired[i + 1], pairs_per_match, max_sudden_death_pairs, match_seed)
+            for i, match_seed in zip(range(0, len(paired), 2), seeds)
+        ]
+        results = _run(tasks, agents, _play_match, processes)
+        rounds.append(
+            KnockoutRound(
+                matches=[
+                    (agents[a].name, agents[b].name, agents[winner].name, margin)
+                    for (a, b, *_), (winner, margin) in zip(tasks, results)
+                ],
+                byes=[agents[i].name for i in byes],
+            )
+        )
+        # Agents with a bye play first in the next round, so nobody gets two in a row
+        remaining = byes + [winner for winner, _ in results]
+    return agents[remaining[0]].name, rounds
+
+
+if __name__ == "__main__":
+    from main import choose_move
+    from policy_table import PolicyAgent, load_policy
+
+    parser = argparse.ArgumentParser(description="Evaluate saved value functions")
+    parser.add_argument("teams", nargs="+", help="team names whose dict_TEAM files to load")
+    parser.add_argument("--games", type=int, default=10000, help="games against the robot")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-loss-rate",
+        type=float,
+        default=None,
+        help="exit with an error if a team's upper 95%% bound on losses is above this",
+    )
+    parser.add_argument(
+        "--policy",
+        action="store_true",
+        help="play from each team's policy_TEAM.npz where exported (see policy_table.py)",
+    )
+    args = parser.parse_args()
+
+    team_agents = []
+    for team in args.teams:
+        team_choose_move = choose_move
+        if args.policy:
+            team_choose_move = PolicyAgent(load_policy(team), fallback=choose_move).choose_move
+        team_agents.append(Agent(team, team_choose_move, load_dictionary(team)))
+    failed = False
+    for team_agent in team_agents:
+        result = evaluate(team_agent, ROBOT, args.games, args.processes, args.seed)
+        print(result.summary())
+        _, (_, loss_high) = result.rate(LOSS)
+        failed |= args.max_loss_rate is not None and loss_high > args.max_loss_rate
+
+    if len(team_agents) > 1:
+        tournament_winner, tournament_rounds = knockout(
+            team_agents, processes=args.processes, seed=args.seed
+        )
+        for number, knockout_round in enumerate(tournament_rounds, 1):
+            for team, opponent, match_winner, margin in knockout_round.matches:
+                print(f"Round {number}: {team} vs {opponent} -> {match_winner} (+{margin})")
+        print(f"Tournament winner: {tournament_winner}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,785 @@
+"""
+The Wild Tic-Tac-Toe game with no rendering: counters, the engine,
+the robot opponent and saving/loading value functions.
+
+Nothing here imports pygame or numpy, so training and evaluation workers
+start quickly. game_mechanics.py re-exports all of it and adds rendering.
+
+>>> import subprocess, sys
+>>> script = (
+...     "import sys, time; start = time.perf_counter(); import game_mechanics; "
+...     "print(time.perf_counter() - start, 'pygame' in sys.modules, 'numpy' in sys.modules)"
+... )
+>>> output = subprocess.run(
+...     [sys.executable, "-c", script],
+...     capture_output=True,
+...     text=True,
+...     cwd=os.path.dirname(os.path.abspath(__file__)),
+... )
+>>> seconds, pygame_imported, numpy_imported = output.stdout.split()
+>>> pygame_imported, numpy_imported
+('False', 'False')
+>>> float(seconds) < IMPORT_BUDGET_SECONDS
+True
+"""
+import os
+import pickle
+import random
+import sys
+from collections.abc import MutableSequence
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Importing game_mechanics (and so this module) must take less than this
+IMPORT_BUDGET_SECONDS = 0.25
+
+######## Below are classes you will use to implement your wild-tic-tac-toe AI ######
+class Cell:
+    '''
+    You will need to interact with this! 
+    
+    This class represents the state of a single square of the
+    tic-tac-toe board.
+    
+    An X counter is represented by Cell.X
+    An O counter is represented by Cell.O
+    A blank square represented by Cell.EMPTY
+        '''
+    EMPTY = " "
+    X = "X"
+    O = "O"
+
+class Player:
+    '''
+    Defines which player's turn it is.
+    
+    Player 1's turn is represented by Player.Player1
+    Player 2's turn is represented by Player.Player2
+    '''
+    Player1 = "Player1"
+    Player2 = "Player2"
+
+
+# Small integer codes for cells and players, used by the array-based tools
+EMPTY_CODE = 0
+X_CODE = 1
+O_CODE = 2
+CELL_TO_CODE = {Cell.EMPTY: EMPTY_CODE, Cell.X: X_CODE, Cell.O: O_CODE}
+CODE_TO_CELL = (Cell.EMPTY, Cell.X, Cell.O)
+
+PLAYER1_CODE = 0
+PLAYER2_CODE = 1
+NO_PLAYER_CODE = -1
+PLAYER_TO_CODE = {Player.Player1: PLAYER1_CODE, Player.Player2: PLAYER2_CODE}
+CODE_TO_PLAYER = (Player.Player1, Player.Player2)
+_PLAYER_CODES = (PLAYER1_CODE, PLAYER2_CODE)
+
+# Results of WildTictactoeMechanics.step_raw()
+OUTCOME_ONGOING = 0
+OUTCOME_WIN = 1
+OUTCOME_DRAW = 2
+
+_STATE_SLOTS = (
+    "geometry",
+    "player_code",
+    "done",
+    "x_mask",
+    "o_mask",
+    "winning_line",
+    "observation",
+    "_cells",
+)
+
+
+def generate_win_lines(size: int, k: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Every run of k squares along a row, column or diagonal of a size x size
+    board, as flat positions: rows first, then columns, then both diagonals.
+
+    >>> generate_win_lines(3, 3)[6:]
+    ((0, 4, 8), (2, 4, 6))
+    >>> len(generate_win_lines(4, 3))
+    24
+    """
+    lines = []
+    for row_step, col_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for row in range(size):
+            for col in range(size):
+                end_row = row + row_step * (k - 1)
+                end_col = col + col_step * (k - 1)
+                if 0 <= end_row < size and 0 <= end_col < size:
+                    lines.append(
+                        tuple((row + row_step * i) * size + col + col_step * i for i in range(k))
+                    )
+    return tuple(lines)
+
+
+class BoardGeometry(NamedTuple):
+    """
+    size:             squares along each side
+    k:                counters in a row needed to win
+    win_lines:        flat positions of every win line
+    win_line_masks:   bitboard of every win line
+    square_lines:     indices into win_lines of the lines through each square
+    symmetries:       the 8 rotations/reflections, each a permutation such
+                      that [board[i] for i in permutation] is the transformed board
+    full_board_mask:  bitboard with every square set
+    is_winning_mask:  is_winning_mask[mask] is True when the bitboard mask
+                      contains a complete line. Only tabulated for boards of
+                      up to 9 squares, None otherwise
+    """
+
+    size: int
+    k: int
+    win_lines: Tuple[Tuple[int, ...], ...]
+    win_line_masks: Tuple[int, ...]
+    square_lines: Tuple[Tuple[int, ...], ...]
+    symmetries: Tuple[Tuple[int, ...], ...]
+    full_board_mask: int
+    is_winning_mask: Optional[Tuple[bool, ...]]
+
+    @property
+    def n_squares(self) -> int:
+        return self.size * self.size
+
+    def completed_line(self, position: int, mask: int) -> Optional[int]:
+        """Index of a complete line of mask that passes through position, if there is one."""
+        for index in self.square_lines[position]:
+            line_mask = self.win_line_masks[index]
+            if mask & line_mask == line_mask:
+                return index
+        return None
+
+    def has_line(self, mask: int) -> bool:
+        if self.is_winning_mask is not None:
+            return self.is_winning_mask[mask]
+        return any(mask & line_mask == line_mask for line_mask in self.win_line_masks)
+
+
+def _symmetries(size: int) -> Tuple[Tuple[int, ...], ...]:
+    def rotate(permutation):
+        return tuple(
+            permutation[(size - 1 - col) * size + row] for row in range(size) for col in range(size)
+        )
+
+    def reflect(permutation):
+        return tuple(
+            permutation[row * size + size - 1 - col] for row in range(size) for col in range(size)
+        )
+
+    permutations = []
+    permutation = tuple(range(size * size))
+    for _ in range(4):
+        permutations += [permutation, reflect(permutation)]
+        permutation = rotate(permutation)
+    return tuple(permutations)
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size: int = 3, k: int = 3) -> BoardGeometry:
+    """
+    The (cached) geometry of a size x size board won by k in a row.
+
+    >>> geometry = get_geometry(4, 3)
+    >>> geometry.n_squares, len(geometry.win_lines), geometry.square_lines[0]
+    (16, 24, (0, 8, 16))
+    >>> get_geometry().is_winning_mask[0b100010001], geometry.is_winning_mask
+    (True, None)
+    """
+    assert 1 <= k <= size, f"k ({k}) must be between 1 and the board size ({size})"
+    win_lines = generate_win_lines(size, k)
+    win_line_masks = tuple(sum(1 << position for position in line) for line in win_lines)
+    n_squares = size * size
+    is_winning_mask = None
+    if n_squares <= 9:
+        is_winning_mask = tuple(
+            any(mask & line_mask == line_mask for line_mask in win_line_masks)
+            for mask in range(1 << n_squares)
+        )
+    return BoardGeometry(
+        size=size,
+        k=k,
+        win_lines=win_lines,
+        win_line_masks=win_line_masks,
+        square_lines=tuple(
+            tuple(index for index, line in enumerate(win_lines) if position in line)
+            for position in range(n_squares)
+        ),
+        symmetries=_symmetries(size),
+        full_board_mask=(1 << n_squares) - 1,
+        is_winning_mask=is_winning_mask,
+    )
+
+
+# The standard 3x3 board, won by 3 in a row
+GEOMETRY = get_geometry(3, 3)
+# Each win line of the 3x3 board, as flat board positions
+WIN_LINES = GEOMETRY.win_lines
+# Bitboards have bit i set when flat position i holds the counter
+WIN_LINE_MASKS = GEOMETRY.win_line_masks
+FULL_BOARD_MASK = GEOMETRY.full_board_mask
+# IS_WINNING_MASK[mask] is True when the bitboard `mask` contains a complete line
+IS_WINNING_MASK = GEOMETRY.is_winning_mask
+# SQUARE_LINES[position] holds the index (into WIN_LINES) of every line through that square
+SQUARE_LINES = GEOMETRY.square_lines
+# Index of a complete line of a 3x3 bitboard that passes through position, if there is one
+completed_line = GEOMETRY.completed_line
+
+
+class _BoardRow(MutableSequence):
+    """
+    One row of WildTictactoeMechanics.board. Cells are read from the env,
+    so a row stays current as the game goes on, and assigning a cell plays
+    it through .mark_square().
+    """
+
+    __slots__ = ("_env", "_row", "_cells", "_start", "_size")
+
+    def __init__(self, env: "WildTictactoeMechanics", row: int):
+        self._env = env
+        self._row = row
+        # env._cells is only ever updated in place, so the row can hold on to it
+        self._cells = env._cells
+        self._size = env.geometry.size
+        self._start = row * self._size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, col):
+        try:
+            if 0 <= col < self._size:
+                return self._cells[self._start + col]
+        except TypeError:
+            pass
+        return self._cells[self._start : self._start + self._size][col]
+
+    def __setitem__(self, col, counter) -> None:
+        if isinstance(col, slice):
+            for index, value in zip(range(self._size)[col], counter):
+                self._env.mark_square(self._row, index, value)
+        else:
+            self._env.mark_square(self._row, range(self._size)[col], counter)
+
+    def __delitem__(self, col) -> None:
+        raise TypeError("Board rows cannot change length")
+
+    def insert(self, col, counter) -> None:
+        raise TypeError("Board rows cannot change length")
+
+    def __eq__(self, other) -> bool:
+        return list(self) == other
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __reduce__(self):
+        # Copies and pickles are plain lists, detached from the env
+        return list, (list(self),)
+
+
+class _Board(tuple):
+    """
+    WildTictactoeMechanics.board: its _BoardRows, which can also be
+    assigned whole. A tuple underneath, so reading a row is as fast as on a
+    list of lists.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, env: "WildTictactoeMechanics"):
+        return super().__new__(cls, (_BoardRow(env, row) for row in range(env.geometry.size)))
+
+    def __setitem__(self, row, cells) -> None:
+        rows = tuple.__getitem__(self, row)
+        if isinstance(row, slice):
+            for board_row, row_cells in zip(rows, list(cells)):
+                board_row[:] = list(row_cells)
+        else:
+            rows[:] = list(cells)
+
+    def __eq__(self, other) -> bool:
+        return [list(row) for row in self] == other
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr([list(row) for row in self])
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+MutableSequence.register(_Board)
+
+
+class WildTictactoeMechanics:
+    """
+    Env class you interact with to play Wild Tic-Tac-Toe
+
+    Contains the .step() and .reset() functions to run the game. See README.md
+        for more details.
+
+    The board is 3x3 and won by 3 in a row unless size and k say
+        otherwise; its lines and bitboards are in .geometry (see
+        get_geometry()).
+
+    Internally the board is held as two bitboards (x_mask and o_mask), so
+        on a 3x3 board checking for a winner is a single table lookup. The
+        .board attribute still reads as a list of lists: a view of the
+        cells that stays current as the game goes on, where assigning the
+        board, a row or a cell updates the bitboards too.
+
+    Only the lines through the square just played can be completed by a
+        move. When a move wins, .winning_line is set to the index of that
+        line in .geometry.win_lines (it is None otherwise).
+
+    For tight loops, .step_raw() and .reset_raw() skip the checks and
+        allocations of .step() and .reset(). They use the integer codes
+        (X_CODE, PLAYER1_CODE, OUTCOME_WIN, ...) and update
+        .observation, a bytearray of the cell codes, in place.
+
+    >>> env = WildTictactoeMechanics()
+    >>> env.board[0][0] = "X"
+    >>> env.board[1] = ["X", " ", "O"]
+    >>> env.x_mask, env.o_mask, env.board
+    (9, 32, [['X', ' ', ' '], ['X', ' ', 'O'], [' ', ' ', ' ']])
+    >>> row = env.board[2]
+    >>> _ = env.step(6, "X")
+    >>> row, env.winning_line
+    (['X', ' ', ' '], 3)
+
+    Random games give the same results as the original list-of-lists
+    engine, which checked every line of the board after each move:
+
+    >>> def original_step(board, player, position, counter):
+    ...     board[position // 3][position % 3] = counter
+    ...     columns = [list(column) for column in zip(*board)]
+    ...     diagonals = [[board[i][i] for i in range(3)], [board[i][2 - i] for i in range(3)]]
+    ...     won = any(
+    ...         len(set(line)) == 1 and line[0] != Cell.EMPTY
+    ...         for line in board + columns + diagonals
+    ...     )
+    ...     full = all(cell != Cell.EMPTY for cells in board for cell in cells)
+    ...     reward = 1.0 if won else 0.0 if full else None
+    ...     other = Player.Player1 if player == Player.Player2 else Player.Player2
+    ...     winner = player if won else None
+    ...     info = {"player_move": None if won or full else other, "winner": winner}
+    ...     return flatten_board(board), reward, won or full, info
+    >>> random.seed(0)
+    >>> matches = []
+    >>> for _ in range(2000):
+    ...     observation, _, done, info = env.reset()
+    ...     board, player = [[Cell.EMPTY] * 3 for _ in range(3)], info["player_move"]
+    ...     while not done:
+    ...         position, counter = robot_choose_move(observation)
+    ...         expected = original_step(board, player, position, counter)
+    ...         observation, reward, done, info = env.step(position, counter)
+    ...         matches.append((observation, reward, done, info) == expected)
+    ...         matches.append(env.board == board)
+    ...         player = info["player_move"]
+    >>> all(matches)
+    True
+
+    Other boards are played the same way, given their size and the
+    number of counters in a row that wins:
+
+    >>> env = WildTictactoeMechanics(size=4, k=3)
+    >>> _ = env.reset()
+    >>> _ = env.step(0, "X")
+    >>> _ = env.step(5, "X")
+    >>> board, reward, done, info = env.step(10, "X")
+    >>> reward, done, env.winning_line, env.board[2]
+    (1.0, True, 16, [' ', ' ', 'X', ' '])
+    """
+
+    # "__dict__" keeps setting other attributes on an env working
+    __slots__ = (
+        "geometry",
+        "player_code",
+        "done",
+        "x_mask",
+        "o_mask",
+        "winning_line",
+        "observation",
+        "_cells",
+        "_rows",
+        "__dict__",
+    )
+
+    def __init__(self, size: int = 3, k: int = 3):
+        self.geometry = get_geometry(size, k)
+        self.player_code = random.choice(_PLAYER_CODES)
+        self.done = False
+        self.x_mask = 0
+        self.o_mask = 0
+        self.winning_line: Optional[int] = None
+        self.observation = bytearray(self.geometry.n_squares)
+        self._cells = [Cell.EMPTY] * self.geometry.n_squares
+        self._rows = _Board(self)
+
+    def __getstate__(self) -> Dict:
+        # The rows refer back to the env, so they are rebuilt rather than copied
+        state = {name: getattr(self, name) for name in _STATE_SLOTS}
+        state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        # Envs pickled before other board sizes were supported are all 3x3
+        self.geometry = GEOMETRY
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._rows = _Board(self)
+
+    def copy(self) -> "WildTictactoeMechanics":
+        """
+        Independent env in the same state, cheaper than copying or replaying .board
+
+        >>> env = WildTictactoeMechanics()
+        >>> _ = env.step(4, "O")
+        >>> clone = env.copy()
+        >>> _ = clone.step(0, "X")
+        >>> env.board[0][0], clone.board[0][0], clone.board[1][1], clone.o_mask
+        (' ', 'X', 'O', 16)
+        """
+        env = self.__class__.__new__(self.__class__)
+        env.geometry = self.geometry
+        env.player_code = self.player_code
+        env.done = self.done
+        env.x_mask = self.x_mask
+        env.o_mask = self.o_mask
+        env.winning_line = self.winning_line
+        env.observation = self.observation[:]
+        env._cells = self._cells[:]
+        env._rows = _Board(env)
+        env.__dict__.update(self.__dict__)
+        return env
+
+    @property
+    def player_move(self) -> str:
+        return CODE_TO_PLAYER[self.player_code]
+
+    @player_move.setter
+    def player_move(self, player_move: str) -> None:
+        self.player_code = PLAYER_TO_CODE[player_move]
+
+    @property
+    def size(self) -> int:
+        return self.geometry.size
+
+    @property
+    def board(self) -> List[List[str]]:
+        return self._rows
+
+    @board.setter
+    def board(self, board: List[List[str]]) -> None:
+        # Copied first, as board may be the env's own rows, cleared below
+        board = [list(cells) for cells in board]
+        self.x_mask = 0
+        self.o_mask = 0
+        self.winning_line = None
+        self.observation[:] = bytes(len(self.observation))
+        self._cells[:] = [Cell.EMPTY] * len(self._cells)
+        for row, cells in enumerate(board):
+            for col, counter in enumerate(cells):
+                if counter != Cell.EMPTY:
+                    self.mark_square(row, col, counter)
+
+    def step(
+        self, position: int, counter: str, verbose: bool = False
+    ) -> Tuple[List[str], Optional[float], bool, Dict]:
+        """
+        Makes 1 step corresponding to 1 player playing 1 counter.
+
+        Returns the new board, reward, whether the game is done.
+        """
+        n_squares = self.geometry.n_squares
+        assert not self.done, "Game is done. Call reset() before taking further steps."
+        assert (
+            0 <= position < n_squares
+        ), f"Output ({position}) not a valid number from 0 -> {n_squares - 1}"
+        assert not (
+            (self.x_mask | self.o_mask) & (1 << position)
+        ), "You moved onto a square that already has a counter on it!"
+        assert counter == Cell.X or counter == Cell.O, f"{counter} is not a valid counter"
+
+        player_move = CODE_TO_PLAYER[self.player_code]
+        outcome = self.step_raw(position, X_CODE if counter == Cell.X else O_CODE)
+        if verbose:
+            print(self)
+
+        if outcome == OUTCOME_WIN:
+            if verbose:
+                print(f"{player_move} wins!")
+            return self._cells[:], 1.0, True, {"player_move": None, "winner": player_move}
+
+        if outcome == OUTCOME_DRAW:
+            if verbose:
+                print("Game Drawn")
+            return self._cells[:], 0.0, True, {"player_move": None, "winner": None}
+
+        next_player = CODE_TO_PLAYER[self.player_code]
+        return self._cells[:], None, False, {"player_move": next_player, "winner": None}
+
+    def step_raw(self, position: int, counter_code: int, validate: bool = False) -> int:
+        """
+        Plays counter_code (X_CODE or O_CODE) at position without allocating.
+
+        Returns OUTCOME_ONGOING, OUTCOME_WIN (the player who moved won) or
+        OUTCOME_DRAW. .observation and .player_code are updated in place.
+        Moves are only checked if validate is True.
+
+        >>> env = WildTictactoeMechanics()
+        >>> env.reset_raw()
+        >>> env.player_code = PLAYER1_CODE
+        >>> observation = env.observation
+        >>> env.step_raw(0, X_CODE), env.step_raw(4, O_CODE), env.player_code
+        (0, 0, 0)
+        >>> env.observation is observation, list(observation)
+        (True, [1, 0, 0, 0, 2, 0, 0, 0, 0])
+        >>> env.step_raw(1, X_CODE), env.step_raw(2, X_CODE) == OUTCOME_WIN, env.done
+        (0, True, True)
+        >>> def check(position, counter_code):
+        ...     try:
+        ...         env.step_raw(position, counter_code, validate=True)
+        ...     except ValueError as error:
+        ...         print(error)
+        >>> check(3, X_CODE)
+        Game is done. Call reset() before taking further steps.
+        >>> env.reset_raw()
+        >>> _ = env.step_raw(4, O_CODE)
+        >>> check(4, X_CODE), check(9, X_CODE), check(3, 3)
+        You moved onto a square that already has a counter on it!
+        Output (9) not a valid number from 0 -> 8
+        3 is not a valid counter code
+        (None, None, None)
+
+        A drawn game, and .step() giving the same results as before:
+
+        >>> env.reset_raw()
+        >>> drawn = [X_CODE, O_CODE, X_CODE, X_CODE, O_CODE, X_CODE, O_CODE, X_CODE, O_CODE]
+        >>> [env.step_raw(position, code) for position, code in enumerate(drawn)]
+        [0, 0, 0, 0, 0, 0, 0, 0, 2]
+        >>> env.reset_raw()
+        >>> env.player_move = Player.Player2
+        >>> board, reward, done, info = env.step(4, "O")
+        >>> board, reward, done
+        ([' ', ' ', ' ', ' ', 'O', ' ', ' ', ' ', ' '], None, False)
+        >>> info
+        {'player_move': 'Player1', 'winner': None}
+        >>> _ = env.step(0, "O")
+        >>> env.step(8, "O")[1:]
+        (1.0, True, {'player_move': None, 'winner': 'Player2'})
+        """
+        if validate:
+            self._validate_raw(position, counter_code)
+        bit = 1 << position
+        if counter_code == X_CODE:
+            mask = self.x_mask | bit
+            self.x_mask = mask
+        else:
+            mask = self.o_mask | bit
+            self.o_mask = mask
+        self.observation[position] = counter_code
+        self._cells[position] = CODE_TO_CELL[counter_code]
+        self.player_code ^= 1
+
+        # mask had no line before this move, so any line now runs through
+        # position. Small boards rule most moves out with one table lookup
+        geometry = self.geometry
+        is_winning_mask = geometry.is_winning_mask
+        if is_winning_mask is None or is_winning_mask[mask]:
+            line = geometry.completed_line(position, mask)
+            if line is not None:
+                self.done = True
+                self.winning_line = line
+                return OUTCOME_WIN
+        if self.x_mask | self.o_mask == geometry.full_board_mask:
+            self.done = True
+            return OUTCOME_DRAW
+        return OUTCOME_ONGOING
+
+    def _validate_raw(self, position: int, counter_code: int) -> None:
+        if self.done:
+            raise ValueError("Game is done. Call reset() before taking further steps.")
+        n_squares = self.geometry.n_squares
+        if not 0 <= position < n_squares:
+            raise ValueError(f"Output ({position}) not a valid number from 0 -> {n_squares - 1}")
+        if (self.x_mask | self.o_mask) & (1 << position):
+            raise ValueError("You moved onto a square that already has a counter on it!")
+        if counter_code != X_CODE and counter_code != O_CODE:
+            raise ValueError(f"{counter_code} is not a valid counter code")
+
+    def reset(self) -> Tuple[List[str], Optional[float], bool, Dict]:
+        self.reset_raw()
+        return self._cells[:], None, self.done, {"player_move": self.player_move}
+
+    def reset_raw(self) -> None:
+        """Like .reset() but reuses the existing buffers and returns nothing."""
+        self.x_mask = 0
+        self.o_mask = 0
+        self.winning_line = None
+        self.observation[:] = bytes(len(self.observation))
+        self._cells[:] = [Cell.EMPTY] * len(self._cells)
+
+        self.player_code = random.choice(_PLAYER_CODES)
+        self.done = False
+
+    def mark_square(self, row: int, col: int, counter: str):
+        """
+        Puts counter (or Cell.EMPTY) on a square, replacing what was there,
+        and keeps .winning_line pointing at a complete line if there is one.
+
+        >>> env = WildTictactoeMechanics()
+        >>> env.player_move = Player.Player1
+        >>> for position in (0, 4):
+        ...     _ = env.step(position, "X")
+        >>> env.winning_line is None
+        True
+        >>> env.step(8, "X")[3], WIN_LINES[env.winning_line]
+        ({'player_move': None, 'winner': 'Player1'}, (0, 4, 8))
+        >>> env.mark_square(1, 1, "O")
+        >>> env.winning_line is None
+        True
+        >>> env.mark_square(1, 1, "X")
+        >>> WIN_LINES[env.winning_line]
+        (0, 4, 8)
+
+        Breaking one complete line leaves any other still reported:
+
+        >>> for position in (1, 2, 3, 6):
+        ...     env.mark_square(position // 3, position % 3, "X")
+        >>> env.mark_square(1, 1, Cell.EMPTY)
+        >>> WIN_LINES[env.winning_line]
+        (0, 1, 2)
+        >>> env.mark_square(0, 1, "O")
+        >>> WIN_LINES[env.winning_line]
+        (0, 3, 6)
+        """
+        geometry = self.geometry
+        position = row * geometry.size + col
+        bit = 1 << position
+        # Clear whatever was on the square before placing the new counter
+        self.x_mask &= ~bit
+        self.o_mask &= ~bit
+        if counter == Cell.X:
+            self.x_mask |= bit
+        elif counter == Cell.O:
+            self.o_mask |= bit
+        self.observation[position] = CELL_TO_CODE[counter]
+        self._cells[position] = counter
+
+        # Overwriting a square can break the line that was complete before,
+        # and another line elsewhere on the board may still be complete
+        if self.winning_line is not None:
+            line_mask = geometry.win_line_masks[self.winning_line]
+            if self.x_mask & line_mask != line_mask and self.o_mask & line_mask != line_mask:
+                self.winning_line = next(
+                    (
+                        index
+                        for index, line_mask in enumerate(geometry.win_line_masks)
+                        if self.x_mask & line_mask == line_mask
+                        or self.o_mask & line_mask == line_mask
+                    ),
+                    None,
+                )
+        elif counter != Cell.EMPTY:
+            mask = self.x_mask if counter == Cell.X else self.o_mask
+            self.winning_line = geometry.completed_line(position, mask)
+
+    def __repr__(self):
+        # Same layout as printing a numpy array of the cells
+        size = self.geometry.size
+        cells = [f"'{cell}'" for cell in self._cells]
+        rows = [" ".join(cells[row : row + size]) for row in range(0, len(cells), size)]
+        return "[[" + "]\n [".join(rows) + "]]\n"
+
+    def is_board_full(self):
+        """Check if the board is full from the combined bitboard."""
+        return self.x_mask | self.o_mask == self.geometry.full_board_mask
+
+    def update(self, move: Tuple[int, int], piece: str) -> None:
+        self.mark_square(move[0], move[1], piece)
+
+    def _check_winner(self) -> Optional[Cell]:
+        if self.geometry.has_line(self.x_mask):
+            return Cell.X
+        if self.geometry.has_line(self.o_mask):
+            return Cell.O
+        return None
+
+    def switch_player(self) -> None:
+        self.player_code ^= 1
+
+
+def flatten_board(board: List[str]) -> List[str]:
+    return [x for xs in board for x in xs]
+
+
+def save_dictionary(my_dict: Dict, team_name: str) -> None:
+    file_name = f"dict_{team_name}.pkl"
+    with open(file_name, "wb") as f:
+        pickle.dump(my_dict, f)
+
+    # ValueTables are also written in the memory-mapped table format, and
+    # any other dict removes the table so it cannot shadow the new pickle.
+    # If value_table was never imported my_dict cannot be one, and numpy is
+    # not imported just to check
+    table_name = f"dict_{team_name}.wttt"
+    value_table = sys.modules.get("value_table")
+    if value_table is not None and isinstance(my_dict, value_table.ValueTable):
+        from table_format import save_table
+
+        save_table(my_dict, table_name)
+    elif os.path.exists(table_name):
+        os.remove(table_name)
+
+
+def load_dictionary(team_name: str) -> Dict:
+    """
+    Loads the memory-mapped dict_{team_name}.wttt table if there is one,
+    otherwise unpickles dict_{team_name}.pkl. save_dictionary() only leaves
+    a table next to a pickle of the same ValueTable.
+
+    >>> import tempfile
+    >>> from value_table import ValueTable
+    >>> cwd = os.getcwd()
+    >>> os.chdir(tempfile.mkdtemp())
+    >>> save_dictionary(ValueTable({(" ",) * 9: 0.5}), "TEST")
+    >>> type(load_dictionary("TEST")).__name__, sorted(os.listdir())
+    ('ValueTable', ['dict_TEST.pkl', 'dict_TEST.wttt'])
+    >>> type(load_dictionary("TEST").table).__name__
+    'memmap'
+
+    Saving a plain dict over it removes the table:
+
+    >>> save_dictionary({(" ",) * 9: 0.25}, "TEST")
+    >>> load_dictionary("TEST"), sorted(os.listdir())
+    ({(' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '): 0.25}, ['dict_TEST.pkl'])
+    >>> os.chdir(cwd)
+    """
+    file_name = f"dict_{team_name}.pkl"
+    table_name = f"dict_{team_name}.wttt"
+    if os.path.exists(table_name):
+        from table_format import load_table
+
+        return load_table(table_name)
+
+    with open(file_name, "rb") as f:
+        return pickle.load(f)
+
+
+def convert_to_indices(number: int, size: int = 3) -> Tuple[int, int]:
+    n_squares = size * size
+    assert number in range(
+        n_squares
+    ), f"Output ({number}) not a valid number from 0 -> {n_squares - 1}"
+    return number // size, number % size
+
+def robot_choose_move(board: List[Cell]) -> Tuple[int, Cell]:
+    position: int = random.choice([count for count, item in enumerate(board) if item == Cell.EMPTY])
+    counter: Cell = random.choice([Cell.O, Cell.X])
+    return position, counter
@@ -0,0 +1,327 @@
+"""
+Append-only binary log of finished games, read back with numpy.memmap.
+
+A file is a 16 byte header followed by one little-endian uint64 per game:
+
+    magic        8s   b"WTTTGAME"
+    version      u16  FORMAT_VERSION
+    record_size  u16  bytes per game (8)
+    padding           zeros up to HEADER_SIZE
+
+Each game packs into its 64 bits as:
+
+    bits 0-44    9 plies of 5 bits, ply i at bit 5 * i: the action
+                 (position * 2 + 1 for an X, see state_space.py) plus 1,
+                 0 once the game is over
+    bit 45       the first player's code (PLAYER1_CODE / PLAYER2_CODE)
+    bits 46-47   the result: RESULT_PLAYER1, RESULT_PLAYER2 or RESULT_DRAW
+
+so a billion plies take a little under 1GB. The readers ignore a record
+half-written when a process stopped, and GameRecorder drops it before
+appending more games.
+
+    with GameRecorder("games.wttg") as recorder:
+        recorder.record_batch(play_batch(100_000, batch_robot_choose_move))
+    print(analyze("games.wttg"))
+"""
+import argparse
+import json
+import os
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_mechanics import BatchWildTictactoeMechanics, batch_robot_choose_move, play_batch
+from game_core import (
+    CODE_TO_PLAYER,
+    NO_PLAYER_CODE,
+    PLAYER1_CODE,
+    PLAYER2_CODE,
+    PLAYER_TO_CODE,
+    X_CODE,
+)
+from state_space import action_to_move, move_to_action
+
+MAGIC = b"WTTTGAME"
+FORMAT_VERSION = 1
+HEADER_SIZE = 16
+RECORD_SIZE = 8
+
+RESULT_PLAYER1 = 1
+RESULT_PLAYER2 = 2
+RESULT_DRAW = 3
+
+_HEADER = struct.Struct("<8sHH")
+_PLY_BITS = 5
+_FIRST_PLAYER_SHIFT = 45
+_RESULT_SHIFT = 46
+_NO_MOVE = -1
+_SHIFTS = np.arange(9, dtype=np.uint64) * np.uint64(_PLY_BITS)
+
+
+class GameLogError(ValueError):
+    pass
+
+
+class GameBatch(NamedTuple):
+    """
+    actions:       (n, 9) int8 action of each ply, -1 after the game ended
+    n_plies:       (n,) int8 number of moves played
+    first_player:  (n,) int8 PLAYER1_CODE or PLAYER2_CODE
+    result:        (n,) int8 RESULT_PLAYER1, RESULT_PLAYER2 or RESULT_DRAW
+    """
+
+    actions: np.ndarray
+    n_plies: np.ndarray
+    first_player: np.ndarray
+    result: np.ndarray
+
+
+class GameRecord(NamedTuple):
+    first_player: str
+    moves: List[Tuple[int, str]]
+    winner: Optional[str]
+
+
+def pack(actions: np.ndarray, first_player: np.ndarray, result: np.ndarray) -> np.ndarray:
+    """
+    Packs games into uint64 records (see the module docstring).
+
+    >>> record = pack(np.array([[8, 1, -1, -1, -1, -1, -1, -1, -1]]), np.array([1]), np.array([3]))
+    >>> unpack(record).actions[0, :3].tolist(), unpack(record).n_plies.tolist()
+    ([8, 1, -1], [2])
+    """
+    fields = (np.asarray(actions, dtype=np.int64) + 1).astype(np.uint64)
+    packed = np.bitwise_or.reduce(fields << _SHIFTS, axis=1)
+    packed |= np.asarray(first_player, dtype=np.uint64) << np.uint64(_FIRST_PLAYER_SHIFT)
+    packed |= np.asarray(result, dtype=np.uint64) << np.uint64(_RESULT_SHIFT)
+    return packed
+
+
+def unpack(records: np.ndarray) -> GameBatch:
+    records = np.asarray(records, dtype=np.uint64)
+    fields = (records[:, None] >> _SHIFTS) & np.uint64((1 << _PLY_BITS) - 1)
+    actions = fields.astype(np.int8) - 1
+    return GameBatch(
+        actions=actions,
+        n_plies=(actions != _NO_MOVE).sum(axis=1).astype(np.int8),
+        first_player=((records >> np.uint64(_FIRST_PLAYER_SHIFT)) & np.uint64(1)).astype(np.int8),
+        result=((records >> np.uint64(_RESULT_SHIFT)) & np.uint64(3)).astype(np.int8),
+    )
+
+
+def _result_code(winner: Optional[str]) -> int:
+    if winner is None:
+        return RESULT_DRAW
+    return RESULT_PLAYER1 if PLAYER_TO_CODE[winner] == PLAYER1_CODE else RESULT_PLAYER2
+
+
+class GameRecorder:
+    """
+    Appends games to a log file, buffering buffer_size games between writes.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "games.wttg")
+    >>> with GameRecorder(path) as recorder:
+    ...     recorder.record("Player2", [(4, "X"), (0, "O"), (8, "X")], None)
+    ...     recorder.record_batch(play_batch(1000, batch_robot_choose_move, seed=0))
+    >>> next(iter_games(path))
+    GameRecord(first_player='Player2', moves=[(4, 'X'), (0, 'O'), (8, 'X')], winner=None)
+    >>> analyze(path)["games"]
+    1001
+    """
+
+    def __init__(self, path: str, buffer_size: int = 65536):
+        self.path = path
+        self.buffer = np.zeros(buffer_size, dtype="<u8")
+        self.n_buffered = 0
+        self.file = open(path, "ab")
+        size = self.file.tell()
+        if size == 0:
+            header = _HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE)
+            self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+        else:
+            _check_header(path)
+            # Drop a record left half-written, so new records stay aligned
+            partial = (size - HEADER_SIZE) % RECORD_SIZE
+            if partial:
+                self.file.truncate(size - partial)
+
+    def record(
+        self, first_player: str, moves: Sequence[Tuple[int, str]], winner: Optional[str]
+    ) -> None:
+        """Records one game, with players and counters as strings like WildTictactoeMechanics."""
+        actions = np.full((1, 9), _NO_MOVE, dtype=np.int64)
+        actions[0, : len(moves)] = [move_to_action(*move) for move in moves]
+        first_player_code = np.array([PLAYER_TO_CODE[first_player]])
+        self._append(pack(actions, first_player_code, np.array([_result_code(winner)])))
+
+    def record_batch(self, env: BatchWildTictactoeMechanics) -> None:
+        """Records every game of a finished BatchWildTictactoeMechanics, e.g. from play_batch()."""
+        assert env.done.all(), "Every game must be finished before it is recorded"
+        actions = np.where(
+            env.positions >= 0, env.positions.astype(np.int64) * 2 + (env.counters == X_CODE), -1
+        )
+        result = np.where(
+            env.winner == NO_PLAYER_CODE,
+            RESULT_DRAW,
+            np.where(env.winner == PLAYER1_CODE, RESULT_PLAYER1, RESULT_PLAYER2),
+        )
+        self._append(pack(actions, env.first_player, result))
+
+    def _append(self, records: np.ndarray) -> None:
+        if self.n_buffered + len(records) > len(self.buffer):
+            self.flush()
+        if len(records) > len(self.buffer):
+            self.file.write(records.astype("<u8").tobytes())
+            return
+        self.buffer[self.n_buffered : self.n_buffered + len(records)] = records
+        self.n_buffered += len(records)
+
+    def flush(self) -> None:
+        self.file.write(self.buffer[: self.n_buffered].tobytes())
+        self.file.flush()
+        self.n_buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> "GameRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _check_header(path: str) -> None:
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise GameLogError(f"{path}: file is too short to be a game log")
+    magic, version, record_size = _HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise GameLogError(f"{path}: not a game log (bad magic {magic!r})")
+    if version != FORMAT_VERSION or record_size != RECORD_SIZE:
+        raise GameLogError(f"{path}: unsupported version {version} / record size {record_size}")
+
+
+def open_log(path: str) -> np.ndarray:
+    """Every complete record in the log as a read-only memory-mapped uint64 array."""
+    _check_header(path)
+    n_records = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+    if n_records == 0:
+        return np.zeros(0, dtype="<u8")
+    return np.memmap(path, dtype="<u8", mode="r", offset=HEADER_SIZE, shape=(n_records,))
+
+
+def read_batches(path: str, batch_size: int = 1 << 20) -> Iterator[GameBatch]:
+    """Yields the games of a log batch_size at a time, unpacked."""
+    records = open_log(path)
+    for start in range(0, len(records), batch_size):
+        yield unpack(records[start : start + batch_size])
+
+
+def iter_games(path: str) -> Iterator[GameRecord]:
+    """Yields the games of a log one at a time."""
+    for batch in read_batches(path, batch_size=4096):
+        for actions, n_plies, first_player, result in zip(*batch):
+            winner = None
+            if result != RESULT_DRAW:
+                winner = CODE_TO_PLAYER[PLAYER1_CODE if result == RESULT_PLAYER1 else PLAYER2_CODE]
+            moves = [action_to_move(int(action)) for action in actions[:n_plies]]
+            yield GameRecord(CODE_TO_PLAYER[first_player], moves, winner)
+
+
+def analyze(path: str, batch_size: int = 1 << 20) -> Dict:
+    """
+    Aggregate statistics of a log, read batch_size games at a time.
+
+    Only fixed-size counters are kept between batches, so memory does not
+    grow with the size of the log.
+
+    games, plies:              totals
+    first_player:              fractions of games won / drawn / lost by the player who moved first
+    opening_moves:             for each first move "position counter", its number of games and
+                               the fraction the first player went on to win
+    counters_by_ply:           fraction of X counters played at each ply
+    winning_move_x_fraction:   fraction of winning moves made with an X
+    mean_game_length:          plies per game
+    """
+    n_games = 0
+    n_plies = 0
+    first_player_results = np.zeros(3, dtype=np.int64)  # won, drawn, lost
+    opening_games = np.zeros(18, dtype=np.int64)
+    opening_wins = np.zeros(18, dtype=np.int64)
+    x_by_ply = np.zeros(9, dtype=np.int64)
+    moves_by_ply = np.zeros(9, dtype=np.int64)
+    winning_moves = np.zeros(2, dtype=np.int64)  # O, X
+
+    for batch in read_batches(path, batch_size):
+        n_games += len(batch.n_plies)
+        n_plies += int(batch.n_plies.sum(dtype=np.int64))
+        winner = np.where(batch.result == RESULT_PLAYER1, PLAYER1_CODE, PLAYER2_CODE)
+        drawn = batch.result == RESULT_DRAW
+        first_won = ~drawn & (winner == batch.first_player)
+        first_player_results += [
+            np.count_nonzero(first_won),
+            np.count_nonzero(drawn),
+            np.count_nonzero(~drawn & ~first_won),
+        ]
+        played = batch.actions != _NO_MOVE
+        openings = batch.actions[played[:, 0], 0]
+        opening_games += np.bincount(openings, minlength=18)
+        opening_wins += np.bincount(batch.actions[first_won & played[:, 0], 0], minlength=18)
+        moves_by_ply += played.sum(axis=0)
+        x_by_ply += (played & (batch.actions % 2 == 1)).sum(axis=0)
+
+        decided = ~drawn & (batch.n_plies > 0)
+        last = batch.actions[decided, batch.n_plies[decided] - 1]
+        winning_moves += np.bincount(last % 2, minlength=2)
+
+    def fraction(count, total) -> float:
+        return float(count) / float(total) if total else 0.0
+
+    openings = {}
+    for action in range(18):
+        if opening_games[action]:
+            position, counter = action_to_move(action)
+            openings[f"{position} {counter}"] = {
+                "games": int(opening_games[action]),
+                "first_player_win_rate": fraction(opening_wins[action], opening_games[action]),
+            }
+    return {
+        "games": n_games,
+        "plies": n_plies,
+        "first_player": dict(
+            zip(("win", "draw", "loss"), (fraction(n, n_games) for n in first_player_results))
+        ),
+        "opening_moves": openings,
+        "counters_by_ply": [fraction(x, n) for x, n in zip(x_by_ply, moves_by_ply)],
+        "winning_move_x_fraction": fraction(winning_moves[1], winning_moves.sum()),
+        "mean_game_length": fraction(n_plies, n_games),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record robot games to a log, or analyze a log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="append robot vs robot games")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--games", type=int, default=1_000_000)
+    record_parser.add_argument("--batch", type=int, default=100_000, help="games played at once")
+    record_parser.add_argument("--seed", type=int, default=None)
+    analyze_parser = commands.add_parser("analyze", help="print statistics as JSON")
+    analyze_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        rng = np.random.default_rng(args.seed)
+        with GameRecorder(args.path) as game_recorder:
+            for first in range(0, args.games, args.batch):
+                n_games = min(args.batch, args.games - first)
+                seed = int(rng.integers(2 ** 63))
+                game_recorder.record_batch(play_batch(n_games, batch_robot_choose_move, seed=seed))
+    else:
+        print(json.dumps(analyze(args.path), indent=2))
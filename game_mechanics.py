@@ -1,152 +1,49 @@
-import pickle
+"""
+Renders Wild Tic-Tac-Toe games with pygame.
+
+The game itself is in game_core.py and everything there is re-exported
+here, so `from game_mechanics import ...` works as before. pygame is only
+imported when something is drawn.
+"""
+import os
 import random
-from typing import Callable, Dict, Iterable, List, Optional, Tuple
-
-import numpy as np
-import pygame
-
-######## Below are classes you will use to implement your wild-tic-tac-toe AI ######
-class Cell:
-    '''
-    You will need to interact with this! 
-    
-    This class represents the state of a single square of the
-    tic-tac-toe board.
-    
-    An X counter is represented by Cell.X
-    An O counter is represented by Cell.O
-    A blank square represented by Cell.EMPTY
-        '''
-    EMPTY = " "
-    X = "X"
-    O = "O"
-
-class Player:
-    '''
-    Defines which player's turn it is.
-    
-    Player 1's turn is represented by Player.Player1
-    Player 2's turn is represented by Player.Player2
-    '''
-    Player1 = "Player1"
-    Player2 = "Player2"
-
-
-class WildTictactoeMechanics:
-    """
-    Env class you interact with to play Wild Tic-Tac-Toe
-
-    Contains the .step() and .reset() functions to run the game. See README.md
-        for more details.
-    """
-    
-    def __init__(self):
-        self.player_move = random.choice([Player.Player1, Player.Player2])
-        self.done = False
-        self.board = [
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-        ]
-
-    def step(
-        self, position: int, counter: str, verbose: bool = False
-    ) -> Tuple[List[str], Optional[float], bool, Dict]:
-        """
-        Makes 1 step corresponding to 1 player playing 1 counter.
-
-        Returns the new board, reward, whether the game is done.
-        """
-        assert not self.done, "Game is done. Call reset() before taking further steps."
-
-        row, col = convert_to_indices(position)
-        assert (
-            self.board[row][col] == Cell.EMPTY
-        ), "You moved onto a square that already has a counter on it!"
-
-        self.mark_square(row, col, counter)
-        if verbose:
-            print(self)
-
-        winner = self._check_winner()
-        reward: Optional[float] = None  # fucking mypy
-
-        if winner is not None:
-            self.done = True
-            winner = self.player_move
-            reward = 1.0
-            if verbose:
-                print(f"{self.player_move.value} wins!")
-        elif self.is_board_full():
-            self.done = True
-            reward = 0.0
-            if verbose:
-                print("Game Drawn")
-        else:
-            reward = None
-
-        self.switch_player()
-        info = {"player_move": self.player_move if not self.done else None, "winner": winner}
-
-        return flatten_board(self.board), reward, self.done, info
-
-    def reset(self) -> Tuple[List[str], Optional[float], bool, Dict]:
-        self.board = [
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-            [Cell.EMPTY, Cell.EMPTY, Cell.EMPTY],
-        ]
-
-        self.player_move = random.choice([Player.Player1, Player.Player2])
-        self.done = False
-        return flatten_board(self.board), None, self.done, {"player_move": self.player_move}
-    
-    def mark_square(self, row: int, col: int, counter: str):
-        self.board[row][col] = counter
-
-    def __repr__(self):
-        return str(np.array([x.value for xs in self.board for x in xs]).reshape((3, 3))) + "\n"
-
-    def is_board_full(self):
-        """Check if the board is full by checking for empty cells after flattening board."""
-        return all(c != Cell.EMPTY for c in [i for sublist in self.board for i in sublist])
-
-    def update(self, move: Tuple[int, int], piece: str) -> None:
-        self.mark_square(move[0], move[1], piece)
-
-    def _check_winning_set(self, iterable: Iterable[Cell]) -> bool:
-        unique_pieces = set(iterable)
-        return Cell.EMPTY not in unique_pieces and len(unique_pieces) == 1
-
-    def _check_winner(self) -> Optional[Cell]:
-        # Check rows
-        for row in self.board:
-            if self._check_winning_set(row):
-                return row[0]
-
-        # Check columns
-        for column in [*zip(*self.board)]:
-            if self._check_winning_set(column):
-                return column[0]
-
-        # Check major diagonal
-        size = len(self.board)
-        major_diagonal = [self.board[i][i] for i in range(size)]
-        if self._check_winning_set(major_diagonal):
-            return major_diagonal[0]
-
-        # Check minor diagonal
-        minor_diagonal = [self.board[i][size - i - 1] for i in range(size)]
-        if self._check_winning_set(minor_diagonal):
-            return minor_diagonal[0]
-
-        return None
-
-    def switch_player(self) -> None:
-        self.player_move = Player.Player1 if self.player_move == Player.Player2 else Player.Player2
-
-
-
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+from game_core import (  # noqa: F401 re-exported
+    CELL_TO_CODE,
+    CODE_TO_CELL,
+    CODE_TO_PLAYER,
+    EMPTY_CODE,
+    FULL_BOARD_MASK,
+    GEOMETRY,
+    IS_WINNING_MASK,
+    NO_PLAYER_CODE,
+    O_CODE,
+    OUTCOME_DRAW,
+    OUTCOME_ONGOING,
+    OUTCOME_WIN,
+    PLAYER1_CODE,
+    PLAYER2_CODE,
+    PLAYER_TO_CODE,
+    SQUARE_LINES,
+    WIN_LINE_MASKS,
+    WIN_LINES,
+    X_CODE,
+    BoardGeometry,
+    Cell,
+    Player,
+    WildTictactoeMechanics,
+    completed_line,
+    convert_to_indices,
+    flatten_board,
+    get_geometry,
+    load_dictionary,
+    robot_choose_move,
+    save_dictionary,
+)
+
+if TYPE_CHECKING:
+    import pygame
 
 
 ######## Do not worry about anything below here ###################
@@ -156,9 +53,10 @@ WIDTH = 600
 HEIGHT = 600
 LINE_WIDTH = 15
 WIN_LINE_WIDTH = 15
-BOARD_ROWS = 3
-BOARD_COLS = 3
-SQUARE_SIZE = 200
+# The window draws the standard board
+BOARD_ROWS = GEOMETRY.size
+BOARD_COLS = GEOMETRY.size
+SQUARE_SIZE = WIDTH // BOARD_COLS
 CIRCLE_RADIUS = 60
 CIRCLE_WIDTH = 15
 CROSS_WIDTH = 25
@@ -173,24 +71,10 @@ CROSS_COLOR = (66, 66, 66)
 
 
 
-def flatten_board(board: List[str]) -> List[str]:
-    return [x for xs in board for x in xs]
-
-
-def save_dictionary(my_dict: Dict, team_name: str) -> None:
-    file_name = f"dict_{team_name}.pkl"
-    with open(file_name, "wb") as f:
-        pickle.dump(my_dict, f)
-
-
-def load_dictionary(team_name: str) -> Dict:
-    file_name = f"dict_{team_name}.pkl"
-    with open(file_name, "rb") as f:
-        return pickle.load(f)
-
-
-def draw_non_board_elements(screen, game, player_move):
-    draw_pieces(screen, game, player_move)
+def draw_non_board_elements(
+    screen, game, player_move, counter_colors: Optional[Dict[int, str]] = None
+):
+    draw_pieces(screen, game, player_move, counter_colors)
 
 
 PLAYER_COLORS = {
@@ -198,78 +82,115 @@ PLAYER_COLORS = {
     "Player2": "red"
 }
 
-counter_colors = {}
-def draw_pieces(screen, game, player_move):
-    # Draw circles and crosses based on board state
-    global counter_colors
-    if flatten_board(game.board).count(" ") == 9:
+
+def square_rect(position: int) -> "pygame.Rect":
+    import pygame
+
+    row, col = convert_to_indices(position)
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+
+def draw_counter(screen, position: int, counter: str, color) -> "pygame.Rect":
+    """Draws one counter and returns the rect of its square, to pass to display.update()."""
+    import pygame
+
+    row, col = convert_to_indices(position)
+    if counter == Cell.O:
+        pygame.draw.circle(
+            screen,
+            color,
+            (
+                int(col * SQUARE_SIZE + SQUARE_SIZE // 2),
+                int(row * SQUARE_SIZE + SQUARE_SIZE // 2),
+            ),
+            CIRCLE_RADIUS,
+            CIRCLE_WIDTH,
+        )
+    elif counter == Cell.X:
+        pygame.draw.line(
+            screen,
+            color,
+            (col * SQUARE_SIZE + SPACE, row * SQUARE_SIZE + SQUARE_SIZE - SPACE),
+            (col * SQUARE_SIZE + SQUARE_SIZE - SPACE, row * SQUARE_SIZE + SPACE),
+            CROSS_WIDTH,
+        )
+        pygame.draw.line(
+            screen,
+            color,
+            (col * SQUARE_SIZE + SPACE, row * SQUARE_SIZE + SPACE),
+            (
+                col * SQUARE_SIZE + SQUARE_SIZE - SPACE,
+                row * SQUARE_SIZE + SQUARE_SIZE - SPACE,
+            ),
+            CROSS_WIDTH,
+        )
+    return square_rect(position)
+
+
+def draw_pieces(screen, game, player_move, counter_colors: Optional[Dict[int, str]] = None):
+    """
+    Draws every counter on the board. counter_colors maps each square to
+    the colour of the team that played there; counters not in it yet are
+    drawn (and recorded) in player_move's colour. Pass the same dict on
+    every call of a game (or use a Renderer) to keep each team's colours:
+    without one, every counter is drawn in player_move's colour.
+
+    >>> os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    '1'
+    >>> import pygame
+    >>> screen = pygame.Surface((WIDTH, HEIGHT))
+    >>> env = WildTictactoeMechanics()
+    >>> env.board[0][0] = "X"
+    >>> counter_colors = {}
+    >>> draw_pieces(screen, env, "Player1", counter_colors)
+    >>> env.board[1][1] = "O"
+    >>> draw_pieces(screen, env, "Player2", counter_colors)
+    >>> counter_colors
+    {0: 'blue', 4: 'red'}
+    >>> draw_pieces(screen, env, "Player2")
+    >>> tuple(screen.get_at((SQUARE_SIZE // 2, SQUARE_SIZE // 2)))
+    (255, 0, 0, 255)
+    """
+    if counter_colors is None:
         counter_colors = {}
-    
     team_color = PLAYER_COLORS[player_move]
-
-
-    board = game.board
-
-    for row in range(BOARD_ROWS):
-        for col in range(BOARD_COLS):
-            color = counter_colors.get((row, col), team_color)
-            if board[row][col] == Cell.O:
-                counter_colors[(row, col)] = color
-                pygame.draw.circle(
-                    screen,
-                    color,
-                    (
-                        int(col * SQUARE_SIZE + SQUARE_SIZE // 2),
-                        int(row * SQUARE_SIZE + SQUARE_SIZE // 2),
-                    ),
-                    CIRCLE_RADIUS,
-                    CIRCLE_WIDTH,
-                )
-            elif board[row][col] == Cell.X:
-                counter_colors[(row, col)] = color
-                pygame.draw.line(
-                    screen,
-                    color,
-                    (col * SQUARE_SIZE + SPACE, row * SQUARE_SIZE + SQUARE_SIZE - SPACE),
-                    (col * SQUARE_SIZE + SQUARE_SIZE - SPACE, row * SQUARE_SIZE + SPACE),
-                    CROSS_WIDTH,
-                )
-                pygame.draw.line(
-                    screen,
-                    color,
-                    (col * SQUARE_SIZE + SPACE, row * SQUARE_SIZE + SPACE),
-                    (
-                        col * SQUARE_SIZE + SQUARE_SIZE - SPACE,
-                        row * SQUARE_SIZE + SQUARE_SIZE - SPACE,
-                    ),
-                    CROSS_WIDTH,
-                )
-
-
-def check_and_draw_win(board: List, counter: str, screen: pygame.Surface, player_move: str) -> bool:
-
-    for col in range(BOARD_COLS):
-        if board[0][col] == counter and board[1][col] == counter and board[2][col] == counter:
-            draw_vertical_winning_line(screen, col, counter, player_move)
+    for position, counter in enumerate(flatten_board(game.board)):
+        if counter != Cell.EMPTY:
+            color = counter_colors.setdefault(position, team_color)
+            draw_counter(screen, position, counter, color)
+
+
+def check_and_draw_win(
+    board: List, counter: str, screen: "pygame.Surface", player_move: str
+) -> bool:
+    mask = 0
+    for position, cell in enumerate(flatten_board(board)):
+        if cell == counter:
+            mask |= 1 << position
+    for line, line_mask in enumerate(GEOMETRY.win_line_masks):
+        if mask & line_mask == line_mask:
+            draw_winning_line(screen, line, player_move)
             return True
+    return False
 
-    for row in range(BOARD_ROWS):
-        if board[row][0] == counter and board[row][1] == counter and board[row][2] == counter:
-            draw_horizontal_winning_line(screen, row, counter, player_move)
-            return True
-
-    if board[2][0] == counter and board[1][1] == counter and board[0][2] == counter:
-        draw_asc_diagonal(screen, counter, player_move)
-        return True
-
-    if board[0][0] == counter and board[1][1] == counter and board[2][2] == counter:
-        draw_desc_diagonal(screen, counter, player_move)
-        return True
 
-    return False
+def draw_winning_line(screen, line: int, player_move: str) -> None:
+    """Draws the line with index `line` in WIN_LINES, e.g. WildTictactoeMechanics.winning_line."""
+    # Lines are numbered rows first, then columns, then the two diagonals
+    first, last = GEOMETRY.win_lines[line][0], GEOMETRY.win_lines[line][-1]
+    if line < BOARD_ROWS:
+        draw_horizontal_winning_line(screen, first // BOARD_COLS, None, player_move)
+    elif line < BOARD_ROWS + BOARD_COLS:
+        draw_vertical_winning_line(screen, first % BOARD_COLS, None, player_move)
+    elif last == GEOMETRY.n_squares - 1:
+        draw_desc_diagonal(screen, None, player_move)
+    else:
+        draw_asc_diagonal(screen, None, player_move)
 
 
 def draw_vertical_winning_line(screen, col, counter: str, player_move):
+    import pygame
+
     posX = col * SQUARE_SIZE + SQUARE_SIZE // 2
     team_color = PLAYER_COLORS[player_move]
 
@@ -283,6 +204,8 @@ def draw_vertical_winning_line(screen, col, counter: str, player_move):
 
 
 def draw_horizontal_winning_line(screen, row, counter, player_move):
+    import pygame
+
     posY = row * SQUARE_SIZE + SQUARE_SIZE // 2
 
     team_color = PLAYER_COLORS[player_move]
@@ -296,6 +219,8 @@ def draw_horizontal_winning_line(screen, row, counter, player_move):
 
 
 def draw_asc_diagonal(screen, counter: str, player_move):
+    import pygame
+
     team_color = PLAYER_COLORS[player_move]
     pygame.draw.line(
         screen,
@@ -307,6 +232,8 @@ def draw_asc_diagonal(screen, counter: str, player_move):
 
 
 def draw_desc_diagonal(screen, counter: str, player_move):
+    import pygame
+
     team_color = PLAYER_COLORS[player_move]
     pygame.draw.line(
         screen,
@@ -317,31 +244,74 @@ def draw_desc_diagonal(screen, counter: str, player_move):
     )
 
 
-def convert_to_indices(number: int) -> Tuple[int, int]:
-    assert number in range(9), f"Output ({number}) not a valid number from 0 -> 8"
-    return number // 3, number % 3
+class Renderer:
+    """
+    Draws a game onto a pygame surface one move at a time.
+
+    Each draw method returns the rect it changed, so the display can be
+    updated with just those rects. The counters drawn and their colours
+    are kept on the renderer, so several renderers can draw different games.
+    Without a screen the renderer draws to an off-screen surface, which
+    needs no display (see export_replays()).
+    """
+
+    def __init__(self, screen: "pygame.Surface" = None, fps: int = 30):
+        import pygame
+
+        self.screen = screen if screen is not None else pygame.Surface((WIDTH, HEIGHT))
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        # Square -> (counter, colour) of every counter drawn
+        self.pieces: Dict[int, Tuple[str, str]] = {}
+
+    def draw_board(self) -> "pygame.Rect":
+        """Clears the board and draws the grid lines."""
+        import pygame
+
+        screen = self.screen
+        self.pieces = {}
+        screen.fill(BG_COLOR)
+        pygame.draw.line(screen, LINE_COLOR, (0, SQUARE_SIZE), (WIDTH, SQUARE_SIZE), LINE_WIDTH)
+        pygame.draw.line(
+            screen, LINE_COLOR, (0, 2 * SQUARE_SIZE), (WIDTH, 2 * SQUARE_SIZE), LINE_WIDTH
+        )
+        pygame.draw.line(screen, LINE_COLOR, (SQUARE_SIZE, 0), (SQUARE_SIZE, HEIGHT), LINE_WIDTH)
+        pygame.draw.line(
+            screen, LINE_COLOR, (2 * SQUARE_SIZE, 0), (2 * SQUARE_SIZE, HEIGHT), LINE_WIDTH
+        )
+        return screen.get_rect()
+
+    def draw_move(self, position: int, counter: str, player_move: str) -> "pygame.Rect":
+        color = PLAYER_COLORS[player_move]
+        self.pieces[position] = (counter, color)
+        return draw_counter(self.screen, position, counter, color)
+
+    def draw_win(self, line: int, player_move: str) -> "pygame.Rect":
+        """Draws the winning line, then redraws the counters it crossed on top of it."""
+        draw_winning_line(self.screen, line, player_move)
+        for position in WIN_LINES[line]:
+            if position in self.pieces:
+                draw_counter(self.screen, position, *self.pieces[position])
+        return self.screen.get_rect()
+
+    def tick(self) -> None:
+        """Waits so that the display is updated at most fps times a second."""
+        self.clock.tick(self.fps)
 
-def robot_choose_move(board: List[Cell]) -> Tuple[int, Cell]:
-    position: int = random.choice([count for count, item in enumerate(board) if item == Cell.EMPTY])
-    counter: Cell = random.choice([Cell.O, Cell.X])
-    return position, counter
 
 def render(
     choose_move: Callable[[List[str], Dict], Tuple],
     player_dict: Dict,
+    fps: int = 30,
 ):
+    # Imported here so that only rendering pays pygame's import cost
+    import pygame
+
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("TIC TAC TOE")
-    screen.fill(BG_COLOR)
-
-    # DRAW LINES
-    pygame.draw.line(screen, LINE_COLOR, (0, SQUARE_SIZE), (WIDTH, SQUARE_SIZE), LINE_WIDTH)
-    pygame.draw.line(screen, LINE_COLOR, (0, 2 * SQUARE_SIZE), (WIDTH, 2 * SQUARE_SIZE), LINE_WIDTH)
-    pygame.draw.line(screen, LINE_COLOR, (SQUARE_SIZE, 0), (SQUARE_SIZE, HEIGHT), LINE_WIDTH)
-    pygame.draw.line(
-        screen, LINE_COLOR, (2 * SQUARE_SIZE, 0), (2 * SQUARE_SIZE, HEIGHT), LINE_WIDTH
-    )
+    renderer = Renderer(screen, fps)
+    pygame.display.update(renderer.draw_board())
 
     game = WildTictactoeMechanics()
 
@@ -350,7 +320,10 @@ def render(
     player_move = random.choice([Player.Player1, Player.Player2])
 
     while not game_quit:
-        for event in pygame.event.get():
+        # Sleep until something happens rather than redrawing in a busy loop
+        events = [pygame.event.wait()] + pygame.event.get()
+        dirty = []
+        for event in events:
             if event.type == pygame.QUIT or (event.type == pygame.MOUSEBUTTONDOWN and game_over):
                 game_quit = True
 
@@ -364,14 +337,97 @@ def render(
                 row, col = convert_to_indices(pos)
                 assert game.board[row][col] == Cell.EMPTY
                 game.mark_square(row, col, counter)
+                dirty.append(renderer.draw_move(pos, counter, player_move))
 
-                game_over = check_and_draw_win(
-                    game.board, Cell.X, screen=screen, player_move=player_move
-                ) or check_and_draw_win(game.board, Cell.O, screen=screen, player_move=player_move)
+                # The engine finds the completed line from the square just played
+                game_over = game.winning_line is not None
                 if game_over:
+                    dirty.append(renderer.draw_win(game.winning_line, player_move))
                     print(f"{player_move} won!")
-                draw_non_board_elements(screen, game, player_move)
                 player_move = Player.Player1 if player_move == Player.Player2 else Player.Player2
 
+        # Only the squares that changed are copied to the display
+        if dirty:
+            pygame.display.update(dirty)
+        renderer.tick()
+
+    pygame.quit()
 
-        pygame.display.update()
+
+Replay = Tuple[str, Sequence[Tuple[int, str]]]
+
+
+def export_replays(
+    games: Sequence[Replay], directory: str, every_move: bool = False
+) -> List[str]:
+    """
+    Draws recorded games to PNG files without a display, e.g. on CI.
+
+    Each game is (first_player, [(position, counter), ...]). Game i is
+    saved as game_{i}.png showing the final board or, with every_move,
+    as game_{i}_{ply}.png after every move. Returns the paths written.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> game = (Player.Player1, [(0, "X"), (1, "O"), (4, "X"), (2, "O"), (8, "X")])
+    >>> paths = export_replays([game], directory, every_move=True)
+    >>> paths += export_replays([game], directory)
+    >>> sorted(os.path.relpath(path, directory) for path in paths) == sorted(os.listdir(directory))
+    True
+    >>> sorted(os.listdir(directory))
+    ['game_0.png', 'game_0_0.png', 'game_0_1.png', 'game_0_2.png', 'game_0_3.png', 'game_0_4.png']
+    >>> import pygame
+    >>> pygame.image.load(paths[-1]).get_size()
+    (600, 600)
+    """
+    # The dummy driver lets pygame run without a window system, and the
+    # import banner would only clutter CI logs
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+
+    os.makedirs(directory, exist_ok=True)
+    renderer = Renderer()
+    paths = []
+    for index, (first_player, moves) in enumerate(games):
+        renderer.draw_board()
+        game = WildTictactoeMechanics()
+        game.reset()
+        game.player_move = first_player
+        for ply, (position, counter) in enumerate(moves):
+            player_move = game.player_move
+            game.step(position, counter)
+            renderer.draw_move(position, counter, player_move)
+            if game.winning_line is not None:
+                renderer.draw_win(game.winning_line, player_move)
+            if every_move:
+                paths.append(os.path.join(directory, f"game_{index}_{ply}.png"))
+                pygame.image.save(renderer.screen, paths[-1])
+        if not every_move:
+            paths.append(os.path.join(directory, f"game_{index}.png"))
+            pygame.image.save(renderer.screen, paths[-1])
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render robot games to PNG files headlessly")
+    parser.add_argument("directory")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--every-move", action="store_true", help="save a frame after each move")
+    args = parser.parse_args()
+
+    recorded = []
+    for _ in range(args.games):
+        env = WildTictactoeMechanics()
+        observation, _, done, info = env.reset()
+        first_player = info["player_move"]
+        moves = []
+        while not done:
+            position, counter = robot_choose_move(observation)
+            observation, _, done, _ = env.step(position, counter)
+            moves.append((position, counter))
+        recorded.append((first_player, moves))
+    for path in export_replays(recorded, args.directory, args.every_move):
+        print(path)
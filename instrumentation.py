@@ -0,0 +1,173 @@
+"""
+Opt-in counters, timers and event callbacks for training and play.
+
+Nothing here runs unless asked for: training functions take an optional
+telemetry argument (None by default), and the engine, value functions and
+choose_move() are instrumented by wrapping them, so the plain versions pay
+no cost at all.
+
+    telemetry = Telemetry()
+    telemetry.on("sweep", CsvEventWriter(open("sweeps.csv", "w")))
+    train(game, method="value_iteration", telemetry=telemetry)
+    telemetry.write_json("telemetry.json")
+"""
+import csv
+import json
+import time
+from collections import Counter, defaultdict, deque
+from collections.abc import Mapping
+from typing import IO, Callable, Deque, Dict, List, Optional, Tuple
+
+from game_core import OUTCOME_DRAW, OUTCOME_WIN, WildTictactoeMechanics
+
+Event = Dict[str, object]
+_MISSING = object()
+
+
+class TimerStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self) -> Dict[str, float]:
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "total_s": self.total, "mean_s": mean, "max_s": self.max}
+
+
+class Telemetry:
+    """
+    Collects named counters, timers and events.
+
+    >>> telemetry = Telemetry()
+    >>> telemetry.count("states", 3)
+    >>> seen = []
+    >>> telemetry.on("sweep", seen.append)
+    >>> telemetry.emit("sweep", delta=0.5)
+    >>> telemetry.snapshot()["counters"], seen
+    ({'states': 3}, [{'event': 'sweep', 'delta': 0.5}])
+    """
+
+    def __init__(self, max_events: int = 100_000):
+        self.counters: Counter = Counter()
+        self.timers: Dict[str, TimerStats] = defaultdict(TimerStats)
+        self.events: Deque[Event] = deque(maxlen=max_events)
+        self._callbacks: Dict[str, List[Callable[[Event], None]]] = defaultdict(list)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timers[name].add(seconds)
+
+    def on(self, event: str, callback: Callable[[Event], None]) -> None:
+        """Calls callback with every event of this type as it is emitted."""
+        self._callbacks[event].append(callback)
+
+    def emit(self, event: str, **data) -> None:
+        record = {"event": event, **data}
+        self.events.append(record)
+        for callback in self._callbacks[event]:
+            callback(record)
+
+    def snapshot(self) -> Dict:
+        return {
+            "counters": dict(self.counters),
+            "timers": {name: stats.to_dict() for name, stats in self.timers.items()},
+            "events": list(self.events),
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+class CsvEventWriter:
+    """Event callback that streams each event as a CSV row, flushing as it goes."""
+
+    def __init__(self, file: IO[str], fields: Optional[List[str]] = None):
+        self.file = file
+        self.fields = fields
+        self._writer: Optional[csv.DictWriter] = None
+
+    def __call__(self, event: Event) -> None:
+        if self._writer is None:
+            self._writer = csv.DictWriter(
+                self.file, fieldnames=self.fields or list(event), extrasaction="ignore"
+            )
+            self._writer.writeheader()
+        self._writer.writerow(event)
+        self.file.flush()
+
+
+class InstrumentedWildTictactoeMechanics(WildTictactoeMechanics):
+    """WildTictactoeMechanics that counts resets, steps, winner checks and results."""
+
+    def __init__(self, telemetry: Telemetry):
+        super().__init__()
+        self.telemetry = telemetry
+
+    def step_raw(self, position: int, counter_code: int, validate: bool = False) -> int:
+        outcome = super().step_raw(position, counter_code, validate)
+        counters = self.telemetry.counters
+        counters["engine.steps"] += 1
+        counters["engine.winner_checks"] += 1
+        if outcome == OUTCOME_WIN:
+            counters["engine.wins"] += 1
+        elif outcome == OUTCOME_DRAW:
+            counters["engine.draws"] += 1
+        return outcome
+
+    def reset_raw(self) -> None:
+        super().reset_raw()
+        self.telemetry.counters["engine.resets"] += 1
+
+    def _check_winner(self):
+        self.telemetry.counters["engine.winner_checks"] += 1
+        return super()._check_winner()
+
+
+class CountingValueFunction(Mapping):
+    """Read-only view of a value function that counts lookup hits and misses."""
+
+    def __init__(self, value_function: Mapping, telemetry: Telemetry):
+        self.value_function = value_function
+        self.telemetry = telemetry
+
+    def __getitem__(self, board):
+        # .get() so that reading through a defaultdict does not insert the board
+        value = self.value_function.get(board, _MISSING)
+        if value is _MISSING:
+            self.telemetry.counters["value_function.misses"] += 1
+            raise KeyError(board)
+        self.telemetry.counters["value_function.hits"] += 1
+        return value
+
+    def __iter__(self):
+        return iter(self.value_function)
+
+    def __len__(self) -> int:
+        return len(self.value_function)
+
+
+def instrument_choose_move(
+    choose_move: Callable[[List[str], Mapping], Tuple[int, str]], telemetry: Telemetry
+) -> Callable[[List[str], Mapping], Tuple[int, str]]:
+    """Wraps choose_move() to time every call, and count value function hits and misses."""
+
+    def timed_choose_move(board: List[str], value_function: Mapping) -> Tuple[int, str]:
+        if value_function is not None:
+            value_function = CountingValueFunction(value_function, telemetry)
+        start = time.perf_counter()
+        move = choose_move(board, value_function)
+        telemetry.add_time("choose_move", time.perf_counter() - start)
+        return move
+
+    return timed_choose_move
@@ -1,18 +1,25 @@
 import random
-from typing import Dict, List, Tuple, NewType, Set
+from typing import Dict, List, Optional, Tuple, NewType, Set
 import doctest
 
+from batch_mechanics import play_batch
+from evaluation import ROBOT, Agent, evaluate
 from game_mechanics import (Cell,
-	convert_to_indices, Player, WildTictactoeMechanics,
+	convert_to_indices, Player, PLAYER1_CODE, WildTictactoeMechanics,
 	load_dictionary,
 	render,
 	save_dictionary)
+from instrumentation import Telemetry
+from policy_table import export_policy, save_policy
+from self_play import epsilon_greedy_policy
+from solver import move_scores, solve
+from symmetry import canonical_board, get_canonical_space
+from training import parallel_value_iteration, resumable_value_iteration, value_iteration
+from value_table import ValueTable
 
 TEAM_NAME = "SCORPIONS"  # <---- Enter your team name here!
 
-import itertools as it
 import numpy as np
-from collections import defaultdict
 import operator
 import copy
 
@@ -31,16 +38,34 @@ def random_policy(board) -> Tuple[int, str]:
 	return position, counter
 
 def copy_board(board: WildTictactoeMechanics):
-	env = WildTictactoeMechanics()
-	env.board = copy.deepcopy(board.board)
-	env.player_move = board.player_move
-	env.done = board.done
-	return env
-
-def train(game: WildTictactoeMechanics) -> Dict:
+	return board.copy()
+
+def train(
+	game: WildTictactoeMechanics,
+	method: str = "solve",
+	telemetry: Optional[Telemetry] = None,
+	checkpoint_path: Optional[str] = None,
+	warm_start: Optional[Dict] = None,
+) -> Dict:
 	"""
 	Arg:
 	----
+	method  "solve" (default) computes the exact minimax value of every
+	position by backward induction (see solver.py). "value_iteration"
+	runs the original single-agent sweeps with a -0.04 step penalty.
+	"parallel_value_iteration" runs the same sweeps across every core,
+	with the values in shared memory (see training.py).
+
+	telemetry  Optional instrumentation.Telemetry that collects per-sweep
+	(or per-layer) counters, timings and events.
+
+	checkpoint_path, warm_start  "value_iteration" only (any other method
+	raises ValueError when they are given). Saves its progress
+	to checkpoint_path after every sweep and resumes from it if it exists.
+	warm_start is a value function from an earlier train() to start from,
+	so only positions whose values changed are swept again (see
+	training.resumable_value_iteration).
+
 	game  The Env that you interact with to play Wild Tic-Tac-Toe.
 	It has two useful functions: .step() & .reset()
 		.reset(): starts a new game with a clean board and
@@ -77,36 +102,42 @@ def train(game: WildTictactoeMechanics) -> Dict:
 	the choose_move function that uses it.
 	"""
 
-	value_function = defaultdict(float)
-	delta = 1000
-	threshold = 0.001
-	states = it.product([Cell.X, Cell.O, Cell.EMPTY], repeat=9)
-	while delta > threshold:
-		delta = 0
-		for s in states:
-			# initialize s
-			env = WildTictactoeMechanics()
-			invalid_board = False
-			for i, c in enumerate(s):
-				state, reward, done, info = env.step(i, c)
-				if done:
-					invalid_board = True
-					break
-			if invalid_board:
-				continue
-
-			v = value_function[tuple(s)]
-			max_action = np.NINF
-			for position, marker in valid_moves(s):
-				bcpy = copy_board(env)
-				next_state, reward, done, info = bcpy.step(position, marker)
-				if reward is None:
-					reward = -0.04
-				update = reward + value_function[tuple(next_state)]
-				max_action = max(max_action, update)
-			value_function[tuple(s)] = max_action
-			delta = max(delta, abs(v - max_action))
-	return value_function
+	# Every reachable position is enumerated once and swept by integer id,
+	# rather than rebuilding boards by replaying game.step(). Positions that
+	# are rotations, reflections or X/O swaps of each other share one entry,
+	# keyed by the canonical board (see choose_move)
+	if method != "value_iteration" and (checkpoint_path or warm_start is not None):
+		raise ValueError(
+			f"checkpoint_path and warm_start only apply to value_iteration, not {method}"
+		)
+	space = get_canonical_space()
+	if method == "solve":
+		solution = solve(space, telemetry)
+		print(solution.summary())
+		values = move_scores(solution)
+	elif method == "value_iteration" and (checkpoint_path or warm_start is not None):
+		initial_values = None
+		if warm_start is not None:
+			if not isinstance(warm_start, ValueTable):
+				warm_start = ValueTable(warm_start)
+			initial_values = warm_start.get_codes(space.codes)
+		values = resumable_value_iteration(
+			space,
+			step_penalty=-0.04,
+			threshold=0.001,
+			checkpoint_path=checkpoint_path,
+			initial_values=initial_values,
+			telemetry=telemetry,
+		)
+	elif method == "value_iteration":
+		values = value_iteration(space, step_penalty=-0.04, threshold=0.001, telemetry=telemetry)
+	elif method == "parallel_value_iteration":
+		values = parallel_value_iteration(
+			space, step_penalty=-0.04, threshold=0.001, telemetry=telemetry
+		)
+	else:
+		raise ValueError(f"Unknown training method: {method}")
+	return ValueTable.from_states(values, space)
 
 
 def choose_move(board: List[str], value_function: Dict) -> Tuple[int, str]:
@@ -134,11 +165,12 @@ def choose_move(board: List[str], value_function: Dict) -> Tuple[int, str]:
 	"""
 	actions = valid_moves(board)
 	best_action = (None, None)
-	best_utility = np.NINF
+	best_utility = -np.inf
 	for position, marker in actions:
 		b = copy.deepcopy(board)
 		b[position] = marker
-		util = value_function[tuple(b)]
+		# .get() so that boards missing from the table are not inserted
+		util = value_function.get(canonical_board(tuple(b)), 0.0)
 		if util > best_utility:
 			best_action = (position, marker)
 			best_utility = util
@@ -174,8 +206,14 @@ if __name__ == "__main__":
 	my_value_fn = train(WildTictactoeMechanics())
 	save_dictionary(my_value_fn, TEAM_NAME)
 	my_value_fn = load_dictionary(TEAM_NAME)
-	net_wins = 0
-	for _ in range(100000):
-		net_wins += test(WildTictactoeMechanics(), my_value_fn)
+	# Best move of every position, so matches need no value function lookups
+	save_policy(export_policy(my_value_fn), TEAM_NAME)
+	# Same as calling test() 100k times, but the games are played in lockstep
+	# and choose_move()'s lookups are made for every game at once
+	agent = epsilon_greedy_policy(my_value_fn, epsilon=0.0)
+	games = play_batch(100000, agent, agent)
+	net_wins = 2 * int(np.sum(games.winner == PLAYER1_CODE)) - games.n_games
 	print(f"Net wins out of 100k: {net_wins}")
+	# Paired games against the random robot, split across all cores
+	print(evaluate(Agent(TEAM_NAME, choose_move, my_value_fn), ROBOT, n_games=10000).summary())
 	render(choose_move, my_value_fn)
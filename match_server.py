@@ -0,0 +1,375 @@
+"""
+Asyncio server that plays moves for many concurrent games from one value table.
+
+Clients connect over TCP or a Unix socket and send one JSON object per line:
+
+    {"id": 7, "board": ["X", " ", "O", " ", " ", " ", " ", " ", " "]}
+
+and get one line back per request, matched up by id:
+
+    {"id": 7, "position": 4, "counter": "X"}
+
+or {"id": 7, "error": "..."} for a bad request. {"id": 8, "command": "stats"}
+returns the server's request count and latency percentiles.
+
+Requests from every connection go into one queue and are evaluated in
+micro-batches, with moves chosen exactly as choose_move() in main.py would
+(see self_play.epsilon_greedy_policy). The queue is bounded, as is the
+number of unanswered requests per connection. When either is full the
+server stops reading from the connection, so a client that sends too fast
+is slowed down by TCP flow control instead of using up memory.
+
+    python match_server.py serve --team SCORPIONS --unix /tmp/wttt.sock
+    python match_server.py load --unix /tmp/wttt.sock --clients 64 --games 100
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import deque
+from collections.abc import Mapping
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from game_core import (
+    CELL_TO_CODE,
+    CODE_TO_CELL,
+    Player,
+    WildTictactoeMechanics,
+    load_dictionary,
+    robot_choose_move,
+)
+from self_play import epsilon_greedy_policy
+
+
+def latency_percentiles(latencies_s) -> Dict[str, float]:
+    """p50/p90/p99/max of latencies given in seconds, in microseconds."""
+    if not len(latencies_s):
+        return {}
+    latencies_us = np.asarray(latencies_s) * 1e6
+    p50, p90, p99 = np.percentile(latencies_us, [50, 90, 99])
+    return {
+        "p50_us": float(p50),
+        "p90_us": float(p90),
+        "p99_us": float(p99),
+        "max_us": float(latencies_us.max()),
+    }
+
+
+def _parse_board(board) -> np.ndarray:
+    if not isinstance(board, list) or len(board) != 9:
+        raise ValueError("board must be a list of 9 cells")
+    try:
+        codes = np.array([CELL_TO_CODE[cell] for cell in board], dtype=np.int8)
+    except (KeyError, TypeError):
+        raise ValueError(f"cells must be one of {list(CELL_TO_CODE)}") from None
+    if codes.all():
+        raise ValueError("the board is full")
+    return codes
+
+
+class MatchServer:
+    """
+    Serves moves from value_function to any number of connections.
+
+    max_batch:      most boards evaluated in one batch
+    max_delay:      seconds the first request of a batch waits for others to join it
+    max_pending:    most requests queued for evaluation across all connections
+    max_in_flight:  most unanswered requests per connection
+
+    A client may send many requests before reading any replies. The replies
+    back up until the connection is paused, and the server stops reading
+    until the client catches up:
+
+    >>> import os, tempfile
+    >>> from value_table import ValueTable
+    >>> async def pipeline(path, n_requests):
+    ...     server = MatchServer(ValueTable())
+    ...     await server.start(path=path)
+    ...     reader, writer = await asyncio.open_unix_connection(path)
+    ...     async def send():
+    ...         request = {"board": ["X"] + [" "] * 8}
+    ...         for request["id"] in range(n_requests):
+    ...             writer.write(json.dumps(request).encode() + b"\\n")
+    ...             await writer.drain()
+    ...     sender = asyncio.ensure_future(send())
+    ...     await asyncio.sleep(0.5)
+    ...     replies = [json.loads(await reader.readline()) for _ in range(n_requests)]
+    ...     await sender
+    ...     writer.close()
+    ...     await server.close()
+    ...     return len(replies), server.stats()["requests"]
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     asyncio.run(pipeline(os.path.join(directory, "wttt.sock"), 20_000))
+    (20000, 20000)
+    """
+
+    def __init__(
+        self,
+        value_function: Mapping,
+        max_batch: int = 256,
+        max_delay: float = 0.001,
+        max_pending: int = 4096,
+        max_in_flight: int = 64,
+        latency_window: int = 100_000,
+    ):
+        self.policy = epsilon_greedy_policy(value_function, epsilon=0.0)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+        self.batch_sizes: Deque[int] = deque(maxlen=latency_window)
+        self.n_requests = 0
+        self.n_errors = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._rng = np.random.default_rng(0)
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None
+    ) -> asyncio.AbstractServer:
+        """Listens on the Unix socket path if given, otherwise on host:port (0 picks a port)."""
+        self._queue = asyncio.Queue(self.max_pending)
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve, path)
+        else:
+            self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.n_requests,
+            "errors": self.n_errors,
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            **latency_percentiles(self.latencies),
+        }
+
+    async def _run_batches(self) -> None:
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(queue.get_nowait())
+
+            boards = np.stack([board for board, _ in batch])
+            positions, counters = self.policy(boards, self._rng)
+            for (_, future), position, counter in zip(batch, positions, counters):
+                if not future.done():
+                    future.set_result((int(position), CODE_TO_CELL[counter]))
+            self.batch_sizes.append(len(batch))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        # Responses are written one at a time: on Python 3.8 a second drain()
+        # waiting on the same paused transport fails an assertion
+        write_lock = asyncio.Lock()
+        responses = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = time.perf_counter()
+                # Waiting here for a free slot stops reading from the connection
+                await in_flight.acquire()
+                task = asyncio.ensure_future(
+                    self._respond(line, received, writer, write_lock, in_flight)
+                )
+                responses.add(task)
+                task.add_done_callback(responses.discard)
+            if responses:
+                await asyncio.gather(*responses)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(
+        self,
+        line: bytes,
+        received: float,
+        writer: asyncio.StreamWriter,
+        write_lock: asyncio.Lock,
+        in_flight: asyncio.Semaphore,
+    ) -> None:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("command") == "stats":
+                response = {"id": request_id, **self.stats()}
+            else:
+                board = _parse_board(request.get("board"))
+                future = asyncio.get_running_loop().create_future()
+                # A full queue makes this wait while holding its in-flight slot
+                await self._queue.put((board, future))
+                position, counter = await future
+                response = {"id": request_id, "position": position, "counter": counter}
+        except (ValueError, AttributeError) as error:
+            self.n_errors += 1
+            response = {"id": request_id, "error": str(error)}
+        try:
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            in_flight.release()
+        self.n_requests += 1
+        self.latencies.append(time.perf_counter() - received)
+
+
+class LoadResult(NamedTuple):
+    games: int
+    moves: int
+    seconds: float
+    wins: int
+    draws: int
+    losses: int
+    latencies: Dict[str, float]
+
+    def summary(self) -> str:
+        latency = ", ".join(f"{name} {value:,.0f}" for name, value in self.latencies.items())
+        return (
+            f"{self.games} games ({self.wins} server wins, {self.draws} draws, "
+            f"{self.losses} losses), {self.moves / self.seconds:,.0f} server moves/s, "
+            f"{self.games / self.seconds:,.0f} games/s\n  client latency: {latency}"
+        )
+
+
+async def _open(host: str, port: int, path: Optional[str]):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _play_games(
+    n_games: int, host: str, port: int, path: Optional[str], latencies: List[float]
+) -> Tuple[int, int, int, int]:
+    """Plays robot_choose_move (Player2) against the server (Player1) on one connection."""
+    reader, writer = await _open(host, port, path)
+    results = {Player.Player1: 0, None: 0, Player.Player2: 0}
+    n_moves = 0
+    try:
+        for game in range(n_games):
+            env = WildTictactoeMechanics()
+            board, _, done, info = env.reset()
+            while not done:
+                if info["player_move"] == Player.Player1:
+                    start = time.perf_counter()
+                    writer.write(json.dumps({"id": game, "board": board}).encode() + b"\n")
+                    await writer.drain()
+                    response = json.loads(await reader.readline())
+                    latencies.append(time.perf_counter() - start)
+                    position, counter = response["position"], response["counter"]
+                    n_moves += 1
+                else:
+                    position, counter = robot_choose_move(board)
+                board, _, done, info = env.step(position, counter)
+            results[info["winner"]] += 1
+    finally:
+        writer.close()
+    return results[Player.Player1], results[None], results[Player.Player2], n_moves
+
+
+async def run_load(
+    n_clients: int = 64,
+    games_per_client: int = 100,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    path: Optional[str] = None,
+) -> LoadResult:
+    """
+    Plays games_per_client robot games on each of n_clients concurrent connections.
+
+    >>> import os, tempfile
+    >>> from value_table import ValueTable
+    >>> async def demo(path):
+    ...     server = MatchServer(ValueTable())
+    ...     await server.start(path=path)
+    ...     result = await run_load(n_clients=8, games_per_client=5, path=path)
+    ...     await server.close()
+    ...     return result, server.stats()
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     result, stats = asyncio.run(demo(os.path.join(directory, "wttt.sock")))
+    >>> result.games, result.wins + result.draws + result.losses, stats["requests"] == result.moves
+    (40, 40, True)
+    """
+    latencies: List[float] = []
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(_play_games(games_per_client, host, port, path, latencies) for _ in range(n_clients))
+    )
+    seconds = time.perf_counter() - start
+    wins, draws, losses, moves = (sum(column) for column in zip(*outcomes))
+    return LoadResult(
+        games=n_clients * games_per_client,
+        moves=moves,
+        seconds=seconds,
+        wins=wins,
+        draws=draws,
+        losses=losses,
+        latencies=latency_percentiles(latencies),
+    )
+
+
+async def _serve_forever(server: MatchServer, args, report_interval: float) -> None:
+    listener = await server.start(args.host, args.port, args.unix)
+    where = args.unix or ":".join(str(part) for part in listener.sockets[0].getsockname()[:2])
+    print(f"Serving on {where}", file=sys.stderr)
+    while True:
+        await asyncio.sleep(report_interval)
+        print(json.dumps(server.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve moves, or load-test a server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("serve", "load"):
+        command_parser = commands.add_parser(command)
+        command_parser.add_argument("--host", default="127.0.0.1")
+        command_parser.add_argument("--port", type=int, default=8765)
+        command_parser.add_argument("--unix", default=None, help="Unix socket path instead of TCP")
+        if command == "serve":
+            command_parser.add_argument("--team", required=True, help="load dict_TEAM")
+            command_parser.add_argument("--max-batch", type=int, default=256)
+            command_parser.add_argument("--max-delay-ms", type=float, default=1.0)
+            command_parser.add_argument("--report-interval", type=float, default=10.0)
+        else:
+            command_parser.add_argument("--clients", type=int, default=64)
+            command_parser.add_argument("--games", type=int, default=100, help="per client")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        match_server = MatchServer(
+            load_dictionary(args.team), args.max_batch, args.max_delay_ms / 1000
+        )
+        try:
+            asyncio.run(_serve_forever(match_server, args, args.report_interval))
+        except KeyboardInterrupt:
+            pass
+    else:
+        random.seed(0)
+        load = run_load(args.clients, args.games, args.host, args.port, args.unix)
+        print(asyncio.run(load).summary())
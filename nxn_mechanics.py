@@ -0,0 +1,22 @@
+"""
+Wild Tic-Tac-Toe on a size x size board, won by k counters in a row.
+
+The engine is WildTictactoeMechanics itself, which takes the board size
+and k; this module keeps the names the n x n tools were written against.
+BoardGeometry generates the win lines and their bitboard masks for any
+board, and .step() and .reset() return (board, reward, done, info) with the
+board as a flat list of size * size cells. Positions count across the rows
+from 0 at the top left.
+
+    env = NxNWildTictactoeMechanics(size=4, k=3)
+
+Any size can be played. nxn_solver.solve_nxn() only solves boards of up to
+16 squares (4x4): its value table has 3 ** n_squares entries, so a 5x5 board
+would need 3 ** 25 of them.
+
+Like game_core.py this imports neither pygame nor numpy.
+"""
+from game_core import BoardGeometry, WildTictactoeMechanics, get_geometry  # noqa: F401 re-exported
+
+# One engine plays every board size
+NxNWildTictactoeMechanics = WildTictactoeMechanics
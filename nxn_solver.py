@@ -0,0 +1,262 @@
+"""
+Exact solver for size x size Wild Tic-Tac-Toe (see nxn_mechanics.py).
+
+Values are stored for every base-3 board code, 3 ** (size * size) of
+them, in int8 arrays indexed by code, so looking up a position is a
+single array read. A 4x4 board has 43M codes, so each array takes 41MB.
+Given a directory, the arrays are memory-mapped .npy files there, and
+the operating system pages them to disk as needed. load_nxn_solution()
+reopens them later without reading them into memory. 5x5 boards
+(3 ** 25 codes) are too big to tabulate; the engine still plays them.
+
+Like solver.py, layers of positions with the same number of counters are
+solved from the full board back to the empty one. Each layer's codes are
+generated in chunks from the occupied squares and the X/O counter on
+each. Of the up to 16 boards related by a rotation, reflection or X/O
+swap, only the one with the smallest code is evaluated, and its value is
+written to the others, so a position's successors are read directly by
+code.
+"""
+import itertools
+import math
+import os
+import time
+import tracemalloc
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game_core import CELL_TO_CODE, CODE_TO_CELL, O_CODE, X_CODE, Cell
+from instrumentation import Telemetry
+from nxn_mechanics import BoardGeometry, get_geometry
+from solver import DRAW, LOSS
+
+# 3 ** 16 codes (a 4x4 board) is the largest table solve_nxn() will build
+MAX_SQUARES = 16
+
+
+class NxNSolution(NamedTuple):
+    """
+    values:      (3 ** n_squares,) WIN/DRAW/LOSS for the player about to move,
+                 indexed by board code
+    distances:   (3 ** n_squares,) plies until the game ends under perfect play
+    seconds:     wall-clock time taken to solve
+    peak_bytes:  peak memory allocated while solving, excluding memory-mapped arrays
+    n_evaluated: number of boards evaluated (one per symmetry class)
+    """
+
+    geometry: BoardGeometry
+    values: np.ndarray
+    distances: np.ndarray
+    seconds: float
+    peak_bytes: int
+    n_evaluated: int
+
+    def code(self, board: Sequence[str]) -> int:
+        code = 0
+        for position, cell in enumerate(board):
+            code += CELL_TO_CODE[cell] * 3 ** position
+        return code
+
+    def value(self, board: Sequence[str]) -> int:
+        return int(self.values[self.code(board)])
+
+    def best_move(self, board: Sequence[str]) -> Tuple[int, str]:
+        """The fastest winning (or slowest losing) move, as (position, counter)."""
+        code = self.code(board)
+        best, best_score = None, None
+        for position, cell in enumerate(board):
+            if cell != Cell.EMPTY:
+                continue
+            for counter_code in (O_CODE, X_CODE):
+                child = code + counter_code * 3 ** position
+                # The child's value is to the opponent, so the mover scores its negation
+                value = -int(self.values[child])
+                distance = int(self.distances[child])
+                score = (value, -distance if value >= DRAW else distance)
+                if best_score is None or score > best_score:
+                    best, best_score = (position, CODE_TO_CELL[counter_code]), score
+        return best
+
+    def summary(self) -> str:
+        size = self.geometry.size
+        return (
+            f"Solved {size}x{size} (k={self.geometry.k}): {self.n_evaluated} boards evaluated "
+            f"in {self.seconds:.1f}s, tables {2 * self.values.nbytes / 2 ** 20:.0f}MB, "
+            f"peak memory {self.peak_bytes / 2 ** 20:.0f}MB"
+        )
+
+
+def _table_paths(directory: str, size: int, k: int) -> Tuple[str, str]:
+    prefix = os.path.join(directory, f"nxn_{size}x{size}_k{k}")
+    return f"{prefix}_values.npy", f"{prefix}_distances.npy"
+
+
+def _winning_masks(geometry: BoardGeometry) -> np.ndarray:
+    """(2 ** n_squares,) bool array, True where the bitboard holds a complete line."""
+    masks = np.arange(1 << geometry.n_squares, dtype=np.int64)
+    winning = np.zeros(len(masks), dtype=bool)
+    for line_mask in geometry.win_line_masks:
+        winning |= masks & line_mask == line_mask
+    return winning
+
+
+def _transforms(geometry: BoardGeometry) -> np.ndarray:
+    """(8, n_squares) array giving the square each square moves to under each symmetry."""
+    return np.argsort(np.array(geometry.symmetries), axis=1)
+
+
+def solve_nxn(
+    size: int = 4,
+    k: int = 3,
+    directory: Optional[str] = None,
+    chunk_size: int = 1 << 18,
+    telemetry: Optional[Telemetry] = None,
+) -> NxNSolution:
+    """
+    Negamax value and distance to the end of the game for every board code.
+
+    With a directory, the tables are written there as memory-mapped .npy
+    files. chunk_size bounds the number of boards handled at once, and so
+    the working memory. If telemetry is given, a "layer" event is emitted
+    for each depth solved.
+
+    The 3x3 results match solver.solve():
+
+    >>> solution = solve_nxn(3, 3)
+    >>> solution.value([" "] * 9), solution.best_move([" "] * 9)
+    (1, (4, 'O'))
+    >>> solution.value(["X", "X", " ", " ", " ", " ", " ", " ", " "])
+    1
+    """
+    geometry = get_geometry(size, k)
+    n_squares = geometry.n_squares
+    if n_squares > MAX_SQUARES:
+        raise ValueError(
+            f"A {size}x{size} board has 3 ** {n_squares} codes, too many to tabulate "
+            f"(at most {MAX_SQUARES} squares)"
+        )
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    n_codes = 3 ** n_squares
+    if directory is None:
+        values = np.zeros(n_codes, dtype=np.int8)
+        distances = np.zeros(n_codes, dtype=np.int8)
+    else:
+        os.makedirs(directory, exist_ok=True)
+        values_path, distances_path = _table_paths(directory, size, k)
+        values = np.lib.format.open_memmap(values_path, "w+", np.int8, (n_codes,))
+        distances = np.lib.format.open_memmap(distances_path, "w+", np.int8, (n_codes,))
+
+    winning = _winning_masks(geometry)
+    powers = 3 ** np.arange(n_squares, dtype=np.int64)
+    bits = 1 << np.arange(n_squares, dtype=np.int64)
+    transforms = _transforms(geometry)
+    n_evaluated = 0
+
+    for depth in reversed(range(n_squares + 1)):
+        layer_start = time.perf_counter()
+        layer_evaluated = 0
+        # Row j of is_o says which of the depth occupied squares hold an O in assignment j
+        is_o = (np.arange(1 << depth)[:, None] >> np.arange(depth)) & 1
+        digits = np.where(is_o, O_CODE, X_CODE)
+        swapped = np.where(is_o, X_CODE, O_CODE)
+        occupancies = np.array(
+            list(itertools.combinations(range(n_squares), depth)), dtype=np.int64
+        ).reshape(math.comb(n_squares, depth), depth)
+        step = max(1, chunk_size >> depth)
+        for first in range(0, len(occupancies), step):
+            occupied = occupancies[first : first + step]
+            # Every board with counters on exactly these squares, one column per occupancy
+            codes = (digits @ powers[occupied].T).ravel()
+            x_masks = ((1 - is_o) @ bits[occupied].T).ravel()
+            o_masks = (is_o @ bits[occupied].T).ravel()
+            images = np.empty((2 * len(transforms), len(codes)), dtype=np.int64)
+            for index, transform in enumerate(transforms):
+                moved = powers[transform[occupied]].T
+                images[2 * index] = (digits @ moved).ravel()
+                images[2 * index + 1] = (swapped @ moved).ravel()
+            is_canonical = codes == images.min(axis=0)
+
+            codes = codes[is_canonical]
+            x_masks, o_masks = x_masks[is_canonical], o_masks[is_canonical]
+            chunk_values, chunk_distances = _evaluate(
+                codes, x_masks, o_masks, depth, n_squares, winning, powers, values, distances
+            )
+            for image in images[:, is_canonical]:
+                values[image] = chunk_values
+                distances[image] = chunk_distances
+            layer_evaluated += len(codes)
+
+        n_evaluated += layer_evaluated
+        if telemetry is not None:
+            telemetry.count("nxn_solver.states_visited", layer_evaluated)
+            telemetry.emit(
+                "layer",
+                depth=depth,
+                states_visited=layer_evaluated,
+                seconds=time.perf_counter() - layer_start,
+            )
+
+    if directory is not None:
+        values.flush()
+        distances.flush()
+    seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if telemetry is not None:
+        telemetry.add_time("nxn_solver.solve", seconds)
+    return NxNSolution(geometry, values, distances, seconds, peak_bytes, n_evaluated)
+
+
+def _evaluate(
+    codes: np.ndarray,
+    x_masks: np.ndarray,
+    o_masks: np.ndarray,
+    depth: int,
+    n_squares: int,
+    winning: np.ndarray,
+    powers: np.ndarray,
+    values: np.ndarray,
+    distances: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Values and distances of boards whose successors are all solved."""
+    # A board with a line was won by the player who just moved
+    won = winning[x_masks] | winning[o_masks]
+    best = np.where(won, LOSS, DRAW).astype(np.int8)
+    best_distances = np.zeros(len(codes), dtype=np.int8)
+    if depth == n_squares:
+        return best, best_distances
+
+    live = np.flatnonzero(~won)
+    codes, occupied = codes[live], x_masks[live] | o_masks[live]
+    live_best = np.full(len(live), LOSS - 1, dtype=np.int8)
+    live_fastest = np.full(len(live), np.iinfo(np.int16).max, dtype=np.int16)
+    live_slowest = np.zeros(len(live), dtype=np.int16)
+    for position in range(n_squares):
+        empty = (occupied >> position) & 1 == 0
+        for counter_code in (X_CODE, O_CODE):
+            children = np.where(empty, codes + counter_code * powers[position], 0)
+            # The value of a move to the player making it is minus the value to the opponent
+            move_values = np.where(empty, -values[children], LOSS - 1).astype(np.int8)
+            move_distances = distances[children].astype(np.int16) + 1
+            better = move_values > live_best
+            equal = empty & (move_values == live_best)
+            live_best = np.where(better, move_values, live_best)
+            fastest = np.where(equal, np.minimum(live_fastest, move_distances), live_fastest)
+            slowest = np.where(equal, np.maximum(live_slowest, move_distances), live_slowest)
+            live_fastest = np.where(better, move_distances, fastest)
+            live_slowest = np.where(better, move_distances, slowest)
+    best[live] = live_best
+    # Win as fast as possible, lose as slowly as possible
+    best_distances[live] = np.where(live_best == LOSS, live_slowest, live_fastest)
+    return best, best_distances
+
+
+def load_nxn_solution(directory: str, size: int = 4, k: int = 3) -> NxNSolution:
+    """Reopens the tables solve_nxn() wrote to directory, memory-mapped read-only."""
+    values_path, distances_path = _table_paths(directory, size, k)
+    values = np.load(values_path, mmap_mode="r")
+    distances = np.load(distances_path, mmap_mode="r")
+    return NxNSolution(get_geometry(size, k), values, distances, 0.0, 0, 0)
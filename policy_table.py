@@ -0,0 +1,152 @@
+"""
+Precomputed best moves for every reachable position.
+
+export_policy() scores the moves of every reachable position once, the
+way choose_move() in main.py does, and keeps the best as an action number
+(see state_space.py) in an int8 array indexed by board code: 19KB for the
+whole game. PolicyAgent then answers choose_move() with one board code
+computation and one list lookup, falling back to another choose_move()
+for positions the table does not cover or when there is no table at all.
+
+    save_policy(export_policy(value_function), TEAM_NAME)
+    agent = PolicyAgent(load_policy(TEAM_NAME), fallback=choose_move)
+    agent.choose_move(board, value_function)
+"""
+import os
+from collections.abc import Mapping
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from state_space import N_CODES, NO_STATE, action_to_move, get_state_space
+from symmetry import get_canonical_codes
+from value_table import ValueTable
+
+NO_ACTION = -1
+_ACTION_MOVES = tuple(action_to_move(action) for action in range(18))
+# Maps each cell to its base-3 digit (see state_space.encode)
+_CELL_DIGITS = str.maketrans(" XO", "012")
+
+
+class PolicyTable(NamedTuple):
+    """
+    best:        (3**9,) int8 best action for each board code, NO_ACTION
+                 where the game is over or the board cannot be reached
+    values:      optional (3**9,) float32 score of the best move, NaN where there is none
+    runner_ups:  optional (3**9, n) int8 next best actions, best first,
+                 padded with NO_ACTION
+    """
+
+    best: np.ndarray
+    values: Optional[np.ndarray] = None
+    runner_ups: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self if array is not None)
+
+    def moves(self, board: List[str]) -> List[Tuple[int, str]]:
+        """The best move then the runner-ups for a board, best first."""
+        code = board_code(board)
+        actions = [int(self.best[code])]
+        if self.runner_ups is not None:
+            actions += self.runner_ups[code].tolist()
+        return [_ACTION_MOVES[action] for action in actions if action != NO_ACTION]
+
+
+def board_code(board: List[str]) -> int:
+    """Same as state_space.encode(), with the digits converted in one go."""
+    return int("".join(reversed(board)).translate(_CELL_DIGITS), 3)
+
+
+def export_policy(
+    value_function: Mapping,
+    n_runner_ups: int = 0,
+    with_values: bool = False,
+    canonical: bool = True,
+) -> PolicyTable:
+    """
+    Builds the table of moves choose_move() would play with value_function.
+
+    Each move is scored by the value of the board it leads to (0.0 if the
+    board is missing), looked up by its canonical board if canonical is
+    True, as train() stores them. Ties go to the first move in
+    valid_moves() order, as in choose_move().
+
+    >>> policy = export_policy({}, n_runner_ups=2)
+    >>> policy.moves(["X", "X", " ", " ", " ", " ", " ", " ", " "])
+    [(2, 'O'), (2, 'X'), (3, 'O')]
+    >>> policy.best.nbytes
+    19683
+    """
+    if not isinstance(value_function, ValueTable):
+        value_function = ValueTable(value_function)
+    space = get_state_space()
+    legal = space.successors != NO_STATE
+    next_codes = space.codes[np.where(legal, space.successors, 0)]
+    if canonical:
+        next_codes = get_canonical_codes()[next_codes]
+    scores = np.where(legal, value_function.get_codes(next_codes), -np.inf)
+    # A stable sort keeps tied moves in action order, which is valid_moves() order
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranked_legal = np.take_along_axis(legal, order, axis=1)
+    ranked = np.where(ranked_legal, order, NO_ACTION).astype(np.int8)
+    live = ~space.terminal
+
+    best = np.full(N_CODES, NO_ACTION, dtype=np.int8)
+    best[space.codes[live]] = ranked[live, 0]
+    values = runner_ups = None
+    if with_values:
+        values = np.full(N_CODES, np.nan, dtype=np.float32)
+        values[space.codes[live]] = np.take_along_axis(scores, order[:, :1], axis=1)[live, 0]
+    if n_runner_ups:
+        runner_ups = np.full((N_CODES, n_runner_ups), NO_ACTION, dtype=np.int8)
+        runner_ups[space.codes[live]] = ranked[live, 1 : 1 + n_runner_ups]
+    return PolicyTable(best, values, runner_ups)
+
+
+def save_policy(policy: PolicyTable, team_name: str) -> None:
+    arrays = {name: array for name, array in policy._asdict().items() if array is not None}
+    with open(f"policy_{team_name}.npz", "wb") as f:
+        np.savez(f, **arrays)
+
+
+def load_policy(team_name: str) -> Optional[PolicyTable]:
+    """Loads policy_{team_name}.npz, or returns None if it has not been exported."""
+    file_name = f"policy_{team_name}.npz"
+    if not os.path.exists(file_name):
+        return None
+    with np.load(file_name) as arrays:
+        return PolicyTable(**{name: arrays[name] for name in arrays.files})
+
+
+class PolicyAgent:
+    """
+    choose_move() from a PolicyTable, or from fallback where the table has no move.
+
+    >>> agent = PolicyAgent(export_policy({}), fallback=None)
+    >>> agent.choose_move(["X", "X", " ", " ", " ", " ", " ", " ", " "], None)
+    (2, 'O')
+    """
+
+    def __init__(
+        self,
+        policy: Optional[PolicyTable],
+        fallback: Optional[Callable[[List[str], Mapping], Tuple[int, str]]],
+    ):
+        self.policy = policy
+        self.fallback = fallback
+        # The move tuples are built once, so a lookup returns one without allocating
+        self._moves = None
+        if policy is not None:
+            self._moves = [
+                _ACTION_MOVES[action] if action != NO_ACTION else None
+                for action in policy.best.tolist()
+            ]
+
+    def choose_move(self, board: List[str], value_function: Optional[Mapping]) -> Tuple[int, str]:
+        if self._moves is not None:
+            move = self._moves[int("".join(reversed(board)).translate(_CELL_DIGITS), 3)]
+            if move is not None:
+                return move
+        return self.fallback(board, value_function)
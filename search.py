@@ -0,0 +1,284 @@
+"""
+Alpha-beta (negamax) search agent that needs no trained value function.
+
+The search works directly on X/O bitboards (see game_core.py). In Wild
+Tic-Tac-Toe any line holding two of the same counter and an empty square
+can be completed by whoever moves next, so:
+
+- if the side to move has such a square it wins immediately, and
+- a move that leaves such a square for the opponent loses immediately.
+
+Both are found with table lookups, used to prune and to order moves, and
+remaining positions are searched with iterative deepening until the
+per-move time budget runs out. Results are kept in a bounded transposition
+table with least-recently-used eviction.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from game_core import FULL_BOARD_MASK, IS_WINNING_MASK, WIN_LINE_MASKS, Cell
+
+WIN_SCORE = 100
+# Scores further than this from 0 are forced wins or losses
+_MATE_THRESHOLD = WIN_SCORE - 20
+
+_EXACT = 0
+_LOWER = 1
+_UPPER = 2
+
+
+def _completing_squares(mask: int) -> int:
+    """Squares that would complete a line of the counters in mask."""
+    squares = 0
+    for line in WIN_LINE_MASKS:
+        if bin(mask & line).count("1") == 2:
+            squares |= line & ~mask
+    return squares
+
+
+# COMPLETING_SQUARES[mask] has the bits of every square that completes a line of mask
+COMPLETING_SQUARES = tuple(_completing_squares(mask) for mask in range(FULL_BOARD_MASK + 1))
+
+
+class _Timeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Bounded mapping of position -> search result, evicting the least recently used."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[int, Tuple[int, int, int, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: int, entry: Tuple[int, int, int, int]) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _key(x_mask: int, o_mask: int) -> Tuple[int, bool]:
+    """
+    Table key of a position, and whether it was made with X and O swapped.
+
+    Swapping every X and O gives an equivalent position, so both share a
+    key. The best move stored with it is in the key's orientation, so its
+    counter must be swapped too when the position was:
+
+    >>> _key(0b001, 0b010), _key(0b010, 0b001)
+    ((514, False), (514, True))
+    """
+    key = (x_mask << 9) | o_mask
+    swapped_key = (o_mask << 9) | x_mask
+    if swapped_key < key:
+        return swapped_key, True
+    return key, False
+
+
+def _to_table_score(score: int, ply: int) -> int:
+    # Forced results are stored relative to the position, not the root
+    if score > _MATE_THRESHOLD:
+        return score + ply
+    if score < -_MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_table_score(score: int, ply: int) -> int:
+    if score > _MATE_THRESHOLD:
+        return score - ply
+    if score < -_MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+class SearchAgent:
+    """
+    Plays Wild Tic-Tac-Toe by searching, with no value function needed.
+
+    >>> agent = SearchAgent()
+    >>> agent.choose_move(["X", "X", " ", " ", "O", " ", " ", " ", " "])
+    (2, 'X')
+    >>> agent.choose_move([" "] * 9)  # The centre wins for the first player
+    (4, 'O')
+    """
+
+    def __init__(self, time_budget: float = 0.05, max_table_size: int = 200_000):
+        self.time_budget = time_budget
+        self.table = TranspositionTable(max_table_size)
+        self.nodes = 0
+        self._deadline = 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "nodes": self.nodes,
+            "table_size": len(self.table),
+            "hits": self.table.hits,
+            "misses": self.table.misses,
+            "evictions": self.table.evictions,
+        }
+
+    def choose_move(
+        self, board: List[str], value_function: Optional[Dict] = None
+    ) -> Tuple[int, str]:
+        """Same signature as choose_move() in main.py. value_function is not used."""
+        x_mask = o_mask = 0
+        for position, cell in enumerate(board):
+            if cell == Cell.X:
+                x_mask |= 1 << position
+            elif cell == Cell.O:
+                o_mask |= 1 << position
+        move, _ = self.search(x_mask, o_mask)
+        position, is_x = move
+        return position, Cell.X if is_x else Cell.O
+
+    def search(self, x_mask: int, o_mask: int) -> Tuple[Tuple[int, bool], int]:
+        """
+        Iterative deepening from the given position until solved or out of time.
+
+        Returns the best move as (position, is_x) and its score.
+        """
+        self._deadline = time.perf_counter() + self.time_budget
+        n_empty = 9 - bin(x_mask | o_mask).count("1")
+        assert n_empty > 0, "The board is full"
+        best = self._ordered_moves(x_mask, o_mask, None)[0]
+        score = 0
+        for depth in range(1, n_empty + 1):
+            try:
+                score, move = self._root(x_mask, o_mask, depth)
+            except _Timeout:
+                break
+            best = move
+            if abs(score) > _MATE_THRESHOLD:
+                break
+        return best, score
+
+    def _root(self, x_mask: int, o_mask: int, depth: int) -> Tuple[int, Tuple[int, bool]]:
+        key, swapped = _key(x_mask, o_mask)
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None and entry[3] is not None:
+            hint = (entry[3][0], entry[3][1] != swapped)
+        alpha, beta = -WIN_SCORE, WIN_SCORE
+        best_move = None
+        for move in self._ordered_moves(x_mask, o_mask, hint):
+            position, is_x = move
+            bit = 1 << position
+            child_x, child_o = (x_mask | bit, o_mask) if is_x else (x_mask, o_mask | bit)
+            if IS_WINNING_MASK[child_x] or IS_WINNING_MASK[child_o]:
+                return WIN_SCORE - 1, move
+            score = -self._negamax(child_x, child_o, depth - 1, -beta, -alpha, 1)
+            if best_move is None or score > alpha:
+                alpha, best_move = max(alpha, score), move
+        return alpha, best_move
+
+    def _ordered_moves(
+        self, x_mask: int, o_mask: int, hint: Optional[Tuple[int, bool]]
+    ) -> List[Tuple[int, bool]]:
+        """Moves as (position, is_x): hint first, then wins, safe moves and losing moves."""
+        occupied = x_mask | o_mask
+        wins, safe, losing = [], [], []
+        for position in range(9):
+            bit = 1 << position
+            if occupied & bit:
+                continue
+            empty_after = FULL_BOARD_MASK & ~(occupied | bit)
+            for is_x in (False, True):
+                child_x, child_o = (x_mask | bit, o_mask) if is_x else (x_mask, o_mask | bit)
+                if IS_WINNING_MASK[child_x] or IS_WINNING_MASK[child_o]:
+                    wins.append((position, is_x))
+                elif (COMPLETING_SQUARES[child_x] | COMPLETING_SQUARES[child_o]) & empty_after:
+                    losing.append((position, is_x))
+                else:
+                    safe.append((position, is_x))
+        moves = wins + safe + losing
+        if hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+    def _negamax(
+        self, x_mask: int, o_mask: int, depth: int, alpha: int, beta: int, ply: int
+    ) -> int:
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self._deadline:
+            raise _Timeout
+
+        occupied = x_mask | o_mask
+        empty = FULL_BOARD_MASK & ~occupied
+        # The side to move can complete a line
+        if (COMPLETING_SQUARES[x_mask] | COMPLETING_SQUARES[o_mask]) & empty:
+            return WIN_SCORE - ply - 1
+        if not empty:
+            return 0
+        if depth <= 0:
+            return 0
+
+        key, swapped = _key(x_mask, o_mask)
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            entry_depth, flag, entry_score, stored_move = entry
+            if stored_move is not None:
+                hint = (stored_move[0], stored_move[1] != swapped)
+            if entry_depth >= depth:
+                entry_score = _from_table_score(entry_score, ply)
+                if flag == _EXACT:
+                    return entry_score
+                if flag == _LOWER and entry_score >= beta:
+                    return entry_score
+                if flag == _UPPER and entry_score <= alpha:
+                    return entry_score
+
+        original_alpha = alpha
+        best_score = -WIN_SCORE
+        best_move = None
+        for move in self._ordered_moves(x_mask, o_mask, hint):
+            position, is_x = move
+            bit = 1 << position
+            child_x, child_o = (x_mask | bit, o_mask) if is_x else (x_mask, o_mask | bit)
+            score = -self._negamax(child_x, child_o, depth - 1, -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = _UPPER
+        elif best_score >= beta:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        # A search that reached the end of the game holds at any depth
+        n_empty = bin(empty).count("1")
+        stored_depth = 9 if depth >= n_empty else depth
+        stored_move = (best_move[0], best_move[1] != swapped)
+        self.table.put(key, (stored_depth, flag, _to_table_score(best_score, ply), stored_move))
+        return best_score
+
+
+_default_agent = SearchAgent()
+
+
+def search_choose_move(board: List[str], value_function: Optional[Dict] = None) -> Tuple[int, str]:
+    """choose_move() for the search agent, sharing one transposition table between calls."""
+    return _default_agent.choose_move(board, value_function)
@@ -0,0 +1,283 @@
+"""
+Streams self-play experience as fixed-size batches of NumPy arrays.
+
+Games are played in lockstep on BatchWildTictactoeMechanics, so no Python
+loop runs per move. Every move becomes one transition, and transitions are
+yielded in batches of batch_size:
+
+    for batch in self_play(batch_size=4096, n_batches=100, seed=0):
+        td_update(values, batch)
+
+Boards are given as base-3 codes (see state_space.py), actions as
+position * 2 + counter index. Only a fixed number of games and one batch
+are held at a time, so memory stays flat however many games are played.
+ReplayBuffer keeps a bounded window of past transitions to sample from.
+"""
+from collections.abc import Mapping
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from batch_mechanics import (
+    BatchPolicy,
+    BatchWildTictactoeMechanics,
+    batch_policy,
+    batch_robot_choose_move,
+)
+from game_core import NO_PLAYER_CODE, O_CODE, PLAYER1_CODE, PLAYER2_CODE, X_CODE
+from search import SearchAgent
+from state_space import N_CODES, POWERS_OF_3, StateSpace, get_state_space
+from symmetry import get_canonical_codes, get_canonical_space
+from value_table import ValueTable
+
+_POWERS_OF_3 = np.array(POWERS_OF_3, dtype=np.int32)
+# Code added to a board by each action, before checking the square is empty
+_ACTION_POSITIONS = np.arange(18) // 2
+_ACTION_CODES = _POWERS_OF_3[_ACTION_POSITIONS] * np.where(np.arange(18) % 2, X_CODE, O_CODE)
+
+
+class Transitions(NamedTuple):
+    """
+    states:       (n,) int32 code of the board before the move
+    actions:      (n,) int8 position * 2 + (1 for an X, 0 for an O)
+    rewards:      (n,) float32 1.0 if the move won, 0.0 otherwise
+    next_states:  (n,) int32 code of the board after the move
+    done:         (n,) bool True if the move ended the game
+    returns:      (n,) float32 result of the game for the player making the
+                  move: 1.0 if they went on to win, -1.0 to lose, 0.0 a draw
+    """
+
+    states: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    next_states: np.ndarray
+    done: np.ndarray
+    returns: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+
+def _empty_transitions(n: int) -> Transitions:
+    return Transitions(
+        states=np.zeros(n, dtype=np.int32),
+        actions=np.zeros(n, dtype=np.int8),
+        rewards=np.zeros(n, dtype=np.float32),
+        next_states=np.zeros(n, dtype=np.int32),
+        done=np.zeros(n, dtype=bool),
+        returns=np.zeros(n, dtype=np.float32),
+    )
+
+
+def _copy_into(target: Transitions, start: int, source: Transitions) -> None:
+    for target_array, source_array in zip(target, source):
+        target_array[start : start + len(source)] = source_array
+
+
+def _play_games(
+    env: BatchWildTictactoeMechanics, policies: Sequence[BatchPolicy], canonical: bool
+) -> Transitions:
+    """Plays one game in every slot of env and returns its moves, game by game."""
+    n = env.n_games
+    # One row per ply, one column per game
+    played = _empty_transitions(9 * n)
+    played = Transitions(*(array.reshape(9, n) for array in played))
+    movers = np.full((9, n), NO_PLAYER_CODE, dtype=np.int8)
+    active = np.zeros((9, n), dtype=bool)
+    positions = np.zeros(n, dtype=np.int8)
+    counters = np.zeros(n, dtype=np.int8)
+
+    boards, _, done, info = env.reset()
+    codes = boards.astype(np.int32) @ _POWERS_OF_3
+    ply = 0
+    while not done.all():
+        for player, policy in zip((PLAYER1_CODE, PLAYER2_CODE), policies):
+            to_move = np.flatnonzero(~done & (info["player_move"] == player))
+            if len(to_move):
+                positions[to_move], counters[to_move] = policy(boards[to_move], env.rng)
+        active[ply] = ~done
+        movers[ply] = env.player_move
+        boards, rewards, next_done, info = env.step(positions, counters)
+        next_codes = boards.astype(np.int32) @ _POWERS_OF_3
+        played.states[ply] = codes
+        played.actions[ply] = positions * 2 + (counters == X_CODE)
+        played.rewards[ply] = rewards
+        played.next_states[ply] = next_codes
+        played.done[ply] = next_done
+        codes, done = next_codes, next_done
+        ply += 1
+
+    winner = env.winner[None, :]
+    played.returns[:] = np.where(winner == NO_PLAYER_CODE, 0.0, np.where(movers == winner, 1, -1))
+    if canonical:
+        canonical_codes = get_canonical_codes()
+        played.states[:] = canonical_codes[played.states]
+        played.next_states[:] = canonical_codes[played.next_states]
+    # Transpose so that the moves of each game are contiguous and in order
+    keep = active.T.ravel()
+    return Transitions(*(array.T.ravel()[keep] for array in played))
+
+
+def self_play(
+    batch_size: int = 1024,
+    player1_policy: BatchPolicy = batch_robot_choose_move,
+    player2_policy: BatchPolicy = batch_robot_choose_move,
+    n_batches: Optional[int] = None,
+    n_parallel: int = 256,
+    seed: Optional[int] = None,
+    canonical: bool = False,
+) -> Iterator[Transitions]:
+    """
+    Yields batches of batch_size transitions, forever unless n_batches is given.
+
+    n_parallel games are played at a time. Each game's moves are consecutive
+    and in order, though a game may be split across two batches. With
+    canonical=True board codes are replaced by their canonical code (see
+    symmetry.py); actions still refer to the board as played.
+
+    >>> batches = list(self_play(batch_size=500, n_batches=3, seed=0))
+    >>> [len(batch) for batch in batches]
+    [500, 500, 500]
+    >>> batch = batches[0]
+    >>> bool(np.all(batch.rewards[batch.done & (batch.returns == 0)] == 0))
+    True
+    >>> bool(np.all(batch.returns[batch.rewards == 1] == 1))
+    True
+    """
+    env = BatchWildTictactoeMechanics(n_parallel, seed)
+    policies = (player1_policy, player2_policy)
+    # Room for a full batch plus the moves of one more round of games
+    pending = _empty_transitions(batch_size + 9 * n_parallel)
+    n_pending = 0
+    n_yielded = 0
+    while n_batches is None or n_yielded < n_batches:
+        played = _play_games(env, policies, canonical)
+        _copy_into(pending, n_pending, played)
+        n_pending += len(played)
+        while n_pending >= batch_size and (n_batches is None or n_yielded < n_batches):
+            yield Transitions(*(array[:batch_size].copy() for array in pending))
+            n_yielded += 1
+            n_pending -= batch_size
+            for array in pending:
+                array[:n_pending] = array[batch_size : batch_size + n_pending]
+
+
+def epsilon_greedy_policy(
+    value_function: Mapping, epsilon: float = 0.1, canonical: bool = True
+) -> BatchPolicy:
+    """
+    Plays the move choose_move() in main.py would, or a random move with probability epsilon.
+
+    value_function is looked up by the board after each move, keyed by its
+    canonical board if canonical is True (as train() builds them).
+    """
+    if not isinstance(value_function, ValueTable):
+        value_function = ValueTable(value_function)
+    canonical_codes = get_canonical_codes() if canonical else np.arange(N_CODES)
+
+    def policy(boards: np.ndarray, rng: np.random.Generator):
+        codes = boards.astype(np.int32) @ _POWERS_OF_3
+        legal = boards[:, _ACTION_POSITIONS] == 0
+        next_codes = np.where(legal, codes[:, None] + _ACTION_CODES, 0)
+        scores = value_function.get_codes(canonical_codes[next_codes])
+        actions = np.where(legal, scores, -np.inf).argmax(axis=1)
+        positions = (actions // 2).astype(np.int8)
+        counters = np.where(actions % 2, X_CODE, O_CODE).astype(np.int8)
+
+        explore = rng.random(len(boards)) < epsilon
+        if explore.any():
+            positions[explore], counters[explore] = batch_robot_choose_move(boards[explore], rng)
+        return positions, counters
+
+    return policy
+
+
+def search_policy(time_budget: float = 0.01) -> BatchPolicy:
+    """The search agent (see search.py) as a batch policy, with its own transposition table."""
+    return batch_policy(SearchAgent(time_budget).choose_move)
+
+
+class ReplayBuffer:
+    """
+    Holds the last `capacity` transitions in preallocated arrays.
+
+    >>> buffer = ReplayBuffer(1000, seed=0)
+    >>> for batch in self_play(batch_size=400, n_batches=4, seed=0):
+    ...     buffer.add(batch)
+    >>> len(buffer), len(buffer.sample(64))
+    (1000, 64)
+    """
+
+    def __init__(self, capacity: int, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.arrays = _empty_transitions(capacity)
+        self.rng = np.random.default_rng(seed)
+        # Index the next transition is written to, wrapping around to 0
+        self.position = 0
+        self.size = 0
+
+    def add(self, batch: Transitions) -> None:
+        # Only the last `capacity` transitions of a batch could survive anyway
+        batch = Transitions(*(array[-self.capacity :] for array in batch))
+        n = len(batch)
+        first = min(n, self.capacity - self.position)
+        _copy_into(self.arrays, self.position, Transitions(*(array[:first] for array in batch)))
+        _copy_into(self.arrays, 0, Transitions(*(array[first:] for array in batch)))
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size: int) -> Transitions:
+        """batch_size transitions chosen uniformly at random, with replacement."""
+        assert self.size, "The buffer is empty"
+        rows = self.rng.integers(0, self.size, size=batch_size)
+        return Transitions(*(array[rows] for array in self.arrays))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def _batch_update(values: np.ndarray, states: np.ndarray, targets: np.ndarray, alpha: float):
+    # Each state moves towards the mean target of its transitions in the
+    # batch, so repeats of a common state do not overshoot
+    errors = targets - values[states]
+    totals = np.bincount(states, weights=errors, minlength=len(values))
+    counts = np.bincount(states, minlength=len(values))
+    seen = counts > 0
+    values[seen] += alpha * (totals[seen] / counts[seen]).astype(values.dtype)
+
+
+def td_update(values: np.ndarray, batch: Transitions, alpha: float = 0.1) -> None:
+    """
+    One TD(0) step for every transition in the batch, in place.
+
+    values is a (3**9,) array of the value of each board code to the player
+    about to move. The opponent moves next, so a move is worth its reward
+    minus the value of the board it leads to, and nothing more if it ended
+    the game.
+    """
+    next_values = np.where(batch.done, 0.0, values[batch.next_states])
+    _batch_update(values, batch.states, batch.rewards - next_values, alpha)
+
+
+def monte_carlo_update(values: np.ndarray, batch: Transitions, alpha: float = 0.1) -> None:
+    """Moves the value of every state in the batch towards the result of its game, in place."""
+    _batch_update(values, batch.states, batch.returns, alpha)
+
+
+def to_value_table(values: np.ndarray, canonical: bool = True) -> ValueTable:
+    """
+    Converts values learned by td_update() or monte_carlo_update() for use by choose_move().
+
+    choose_move() scores a board for the player who just moved there, so a
+    won board scores 1 and any other board minus its value to the opponent.
+
+    >>> values = np.zeros(3 ** 9, dtype=np.float32)
+    >>> for batch in self_play(batch_size=4096, n_batches=20, seed=0, canonical=True):
+    ...     td_update(values, batch, alpha=0.5)
+    >>> table = to_value_table(values)
+    >>> len(table), table[("X", "X", "X", " ", " ", " ", " ", " ", " ")]
+    (1359, 1.0)
+    """
+    space: StateSpace = get_canonical_space() if canonical else get_state_space()
+    scores = np.where(space.won, 1.0, -values[space.codes])
+    return ValueTable.from_states(scores, space)
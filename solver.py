@@ -0,0 +1,116 @@
+"""
+Exact solver for Wild Tic-Tac-Toe by backward induction over depth layers.
+
+Every move adds a counter, so the successors of a state with d counters all
+have d + 1. Solving the full layer first, then the one before it and so on
+back to the empty board, gives every state its game-theoretic value in a
+single pass with no iteration to convergence.
+"""
+import time
+import tracemalloc
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from instrumentation import Telemetry
+from state_space import NO_STATE, StateSpace
+from symmetry import get_canonical_space
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+class Solution(NamedTuple):
+    """
+    values:      (n_states,) WIN/DRAW/LOSS for the player about to move
+    distances:   (n_states,) plies until the game ends under perfect play
+                 (the winner wins as fast as possible, the loser delays)
+    seconds:     wall-clock time taken to solve
+    peak_bytes:  peak memory allocated while solving
+    """
+
+    values: np.ndarray
+    distances: np.ndarray
+    seconds: float
+    peak_bytes: int
+
+    def summary(self) -> str:
+        return (
+            f"Solved {len(self.values)} states in {self.seconds * 1000:.1f}ms, "
+            f"peak memory {self.peak_bytes / 1024:.0f}KB"
+        )
+
+
+def solve(space: StateSpace = None, telemetry: Optional[Telemetry] = None) -> Solution:
+    """
+    Negamax value and distance to the end of the game for every state.
+
+    If telemetry is given, a "layer" event is emitted for each depth solved.
+
+    >>> solution = solve()
+    >>> space = get_canonical_space()
+    >>> int(solution.values[space.state_id([" "] * 9)])  # The first player wins
+    1
+    >>> int(solution.values[space.state_id(["X", "X", " ", " ", " ", " ", " ", " ", " "])])
+    1
+    >>> int(solution.distances[space.state_id(["X", "X", " ", " ", " ", " ", " ", " ", " "])])
+    1
+    """
+    space = space or get_canonical_space()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    values = np.zeros(space.n_states, dtype=np.int8)
+    distances = np.zeros(space.n_states, dtype=np.int8)
+    # A state with a line was won by the player who just moved
+    values[space.won] = LOSS
+
+    n_layers = len(space.layer_offsets) - 1
+    for depth in reversed(range(n_layers)):
+        layer = np.arange(space.layer_offsets[depth], space.layer_offsets[depth + 1])
+        layer = layer[~space.terminal[layer]]
+        if not len(layer):
+            continue
+        successors = space.successors[layer]
+        legal = successors != NO_STATE
+        successors = np.where(legal, successors, 0)
+        # The value of a move to the player making it is minus the value to the opponent
+        move_values = np.where(legal, -values[successors], LOSS - 1)
+        move_distances = distances[successors].astype(np.int16) + 1
+
+        best = move_values.max(axis=1)
+        is_best = legal & (move_values == best[:, None])
+        # Win as fast as possible, lose as slowly as possible
+        fastest = np.where(is_best, move_distances, np.iinfo(np.int16).max).min(axis=1)
+        slowest = np.where(is_best, move_distances, 0).max(axis=1)
+        values[layer] = best
+        distances[layer] = np.where(best == LOSS, slowest, fastest)
+        if telemetry is not None:
+            telemetry.count("solver.states_visited", len(layer))
+            telemetry.emit(
+                "layer",
+                depth=depth,
+                states_visited=len(layer),
+                wins=int(np.count_nonzero(best == WIN)),
+                draws=int(np.count_nonzero(best == DRAW)),
+                losses=int(np.count_nonzero(best == LOSS)),
+            )
+
+    seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if telemetry is not None:
+        telemetry.add_time("solver.solve", seconds)
+    return Solution(values=values, distances=distances, seconds=seconds, peak_bytes=peak_bytes)
+
+
+def move_scores(solution: Solution) -> np.ndarray:
+    """
+    Scores each state for the player who just moved into it, for choose_move().
+
+    A win scores just under 1 and a loss just over -1, shifted by the
+    distance so the fastest win and the slowest loss score highest.
+    """
+    outcome = -solution.values.astype(np.float32)
+    return outcome * (1.0 - solution.distances.astype(np.float32) / 100)
@@ -0,0 +1,198 @@
+"""
+Every legal position of Wild Tic-Tac-Toe, with a dense integer id for each.
+
+Boards are encoded in base 3: position i contributes CELL_TO_CODE[cell] * 3**i,
+so every board maps to an int code in [0, 3**9). Only positions reachable
+from the empty board are enumerated (by breadth-first search), and they are
+numbered 0 -> n_states - 1 in order of the number of counters on the board.
+
+Actions are numbered position * 2 + counter_index, where counter_index is 0
+for an O and 1 for an X. This is the same order as valid_moves() in main.py.
+"""
+from functools import lru_cache
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from game_core import (
+    CELL_TO_CODE,
+    CODE_TO_CELL,
+    FULL_BOARD_MASK,
+    IS_WINNING_MASK,
+    O_CODE,
+    X_CODE,
+    Cell,
+)
+
+N_CODES = 3 ** 9
+N_ACTIONS = 18
+POWERS_OF_3 = tuple(3 ** position for position in range(9))
+ACTION_COUNTERS = (Cell.O, Cell.X)
+ACTION_COUNTER_CODES = (O_CODE, X_CODE)
+NO_STATE = -1
+
+
+def encode(board: Sequence[str]) -> int:
+    """Base-3 code of a flat board.
+
+    >>> encode([" "] * 9)
+    0
+    >>> encode(["X", "O", " ", " ", " ", " ", " ", " ", " "])
+    7
+    """
+    code = 0
+    for cell, power in zip(board, POWERS_OF_3):
+        code += CELL_TO_CODE[cell] * power
+    return code
+
+
+def decode(code: int) -> List[str]:
+    """Flat board from its base-3 code.
+
+    >>> decode(7)
+    ['X', 'O', ' ', ' ', ' ', ' ', ' ', ' ', ' ']
+    """
+    board = []
+    for _ in range(9):
+        code, digit = divmod(code, 3)
+        board.append(CODE_TO_CELL[digit])
+    return board
+
+
+def encode_masks(x_mask: int, o_mask: int) -> int:
+    """Base-3 code of a board given as X and O bitboards."""
+    code = 0
+    for position, power in enumerate(POWERS_OF_3):
+        bit = 1 << position
+        if x_mask & bit:
+            code += X_CODE * power
+        elif o_mask & bit:
+            code += O_CODE * power
+    return code
+
+
+def action_to_move(action: int) -> Tuple[int, str]:
+    """(position, counter) move for an action number."""
+    return action // 2, ACTION_COUNTERS[action % 2]
+
+
+def move_to_action(position: int, counter: str) -> int:
+    return position * 2 + (counter == Cell.X)
+
+
+class StateSpace(NamedTuple):
+    """
+    Arrays describing every reachable position, indexed by state id.
+
+    codes:          (n_states,) base-3 code of each state
+    index:          (3**9,) state id of each code, NO_STATE if unreachable
+    depth:          (n_states,) number of counters on the board
+    layer_offsets:  state ids with depth d are layer_offsets[d]:layer_offsets[d + 1]
+    terminal:       (n_states,) True if the game is over (a line or a full board)
+    won:            (n_states,) True if the board has a complete line
+    successors:     (n_states, N_ACTIONS) next state id, NO_STATE if the move is illegal
+    rewards:        (n_states, N_ACTIONS) reward to the player making the move:
+                    1.0 if it wins, 0.0 otherwise
+    """
+
+    codes: np.ndarray
+    index: np.ndarray
+    depth: np.ndarray
+    layer_offsets: np.ndarray
+    terminal: np.ndarray
+    won: np.ndarray
+    successors: np.ndarray
+    rewards: np.ndarray
+
+    @property
+    def n_states(self) -> int:
+        return len(self.codes)
+
+    def state_id(self, board: Sequence[str]) -> int:
+        return int(self.index[encode(board)])
+
+    def board(self, state_id: int) -> List[str]:
+        return decode(int(self.codes[state_id]))
+
+
+def _children(x_mask: int, o_mask: int, code: int):
+    """Yields (action, x_mask, o_mask, code) for every legal move."""
+    occupied = x_mask | o_mask
+    for position in range(9):
+        bit = 1 << position
+        if occupied & bit:
+            continue
+        yield position * 2, x_mask, o_mask | bit, code + O_CODE * POWERS_OF_3[position]
+        yield position * 2 + 1, x_mask | bit, o_mask, code + X_CODE * POWERS_OF_3[position]
+
+
+@lru_cache(maxsize=None)
+def get_state_space() -> StateSpace:
+    """
+    Enumerates every position reachable from the empty board, once.
+
+    The result is cached, so calling this again is free.
+
+    >>> space = get_state_space()
+    >>> space.n_states == len(set(space.codes.tolist()))
+    True
+    >>> space.state_id([" "] * 9)
+    0
+    >>> int(space.successors[0, move_to_action(4, "X")]) == space.state_id(
+    ...     [" ", " ", " ", " ", "X", " ", " ", " ", " "]
+    ... )
+    True
+    """
+    # Breadth-first search: every move adds one counter, so each layer holds
+    # the states with the same number of counters
+    masks = [(0, 0)]
+    codes = [0]
+    layer_offsets = [0]
+    seen = {0}
+    layer_start = 0
+    while layer_start < len(codes):
+        layer_end = len(codes)
+        layer_offsets.append(layer_end)
+        for state in range(layer_start, layer_end):
+            x_mask, o_mask = masks[state]
+            if IS_WINNING_MASK[x_mask] or IS_WINNING_MASK[o_mask]:
+                continue
+            for _, child_x, child_o, child_code in _children(x_mask, o_mask, codes[state]):
+                if child_code not in seen:
+                    seen.add(child_code)
+                    masks.append((child_x, child_o))
+                    codes.append(child_code)
+        layer_start = layer_end
+
+    n_states = len(codes)
+    codes_array = np.array(codes, dtype=np.int32)
+    index = np.full(N_CODES, NO_STATE, dtype=np.int32)
+    index[codes_array] = np.arange(n_states, dtype=np.int32)
+
+    depth = np.empty(n_states, dtype=np.int8)
+    won = np.empty(n_states, dtype=bool)
+    terminal = np.empty(n_states, dtype=bool)
+    successors = np.full((n_states, N_ACTIONS), NO_STATE, dtype=np.int32)
+    rewards = np.zeros((n_states, N_ACTIONS), dtype=np.float32)
+    for state, (x_mask, o_mask) in enumerate(masks):
+        depth[state] = bin(x_mask | o_mask).count("1")
+        won[state] = IS_WINNING_MASK[x_mask] or IS_WINNING_MASK[o_mask]
+        terminal[state] = won[state] or (x_mask | o_mask) == FULL_BOARD_MASK
+        if terminal[state]:
+            continue
+        for action, child_x, child_o, child_code in _children(x_mask, o_mask, codes[state]):
+            successors[state, action] = index[child_code]
+            rewards[state, action] = float(IS_WINNING_MASK[child_x] or IS_WINNING_MASK[child_o])
+
+    for array in (codes_array, index, depth, won, terminal, successors, rewards):
+        array.flags.writeable = False
+    return StateSpace(
+        codes=codes_array,
+        index=index,
+        depth=depth,
+        layer_offsets=np.array(layer_offsets, dtype=np.int32),
+        terminal=terminal,
+        won=won,
+        successors=successors,
+        rewards=rewards,
+    )
@@ -0,0 +1,141 @@
+"""
+Symmetry reduction for Wild Tic-Tac-Toe positions.
+
+Either player may place either counter, so a position is worth the same as
+any of its 8 rotations/reflections, and as the same board with every X and
+O swapped. Each board's canonical form is the transformed board with the
+smallest base-3 code (see state_space.py) of these 16.
+"""
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from state_space import (
+    N_CODES,
+    NO_STATE,
+    POWERS_OF_3,
+    StateSpace,
+    decode,
+    encode,
+    get_state_space,
+)
+
+
+def _rotate(permutation: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Rotates a board permutation by 90 degrees clockwise."""
+    return tuple(permutation[(2 - col) * 3 + row] for row in range(3) for col in range(3))
+
+
+def _reflect(permutation: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Mirrors a board permutation left <-> right."""
+    return tuple(permutation[row * 3 + 2 - col] for row in range(3) for col in range(3))
+
+
+def _board_symmetries() -> Tuple[Tuple[int, ...], ...]:
+    permutations = []
+    permutation = tuple(range(9))
+    for _ in range(4):
+        permutations += [permutation, _reflect(permutation)]
+        permutation = _rotate(permutation)
+    return tuple(permutations)
+
+
+# The transformed board is [board[i] for i in permutation] for each of the 8 permutations
+BOARD_SYMMETRIES = _board_symmetries()
+# Maps cell codes to themselves with X and O swapped
+_SWAP_COUNTERS = np.array([0, 2, 1], dtype=np.int32)
+
+
+@lru_cache(maxsize=None)
+def get_canonical_codes() -> np.ndarray:
+    """
+    (3**9,) array giving the canonical code of every base-3 board code.
+
+    >>> codes = get_canonical_codes()
+    >>> int(codes[encode(["X"] + [" "] * 8)]) == int(codes[encode([" "] * 8 + ["O"])])
+    True
+    """
+    powers = np.array(POWERS_OF_3, dtype=np.int32)
+    digits = (np.arange(N_CODES, dtype=np.int32)[:, None] // powers) % 3
+    canonical = np.arange(N_CODES, dtype=np.int32)
+    for permutation in BOARD_SYMMETRIES:
+        permuted = digits[:, permutation]
+        canonical = np.minimum(canonical, permuted @ powers)
+        canonical = np.minimum(canonical, _SWAP_COUNTERS[permuted] @ powers)
+    canonical.flags.writeable = False
+    return canonical
+
+
+def canonical_code(code: int) -> int:
+    return int(get_canonical_codes()[code])
+
+
+@lru_cache(maxsize=N_CODES)
+def canonical_board(board: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Canonical form of a flat board, as a tuple. Results are cached.
+
+    >>> canonical_board(("X", " ", " ", " ", " ", " ", " ", " ", " "))
+    ('X', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ')
+    >>> canonical_board((" ", " ", "O", " ", " ", " ", " ", " ", " "))
+    ('X', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ')
+    """
+    return tuple(decode(canonical_code(encode(board))))
+
+
+def is_canonical(board: Sequence[str]) -> bool:
+    code = encode(board)
+    return canonical_code(code) == code
+
+
+@lru_cache(maxsize=None)
+def get_canonical_space() -> StateSpace:
+    """
+    The StateSpace reduced to one state per symmetry class.
+
+    Its states are the canonical boards. index maps the code of *any*
+    reachable board to the id of its canonical state, and successors point
+    at canonical states, so everything that works on a StateSpace works on
+    this one unchanged.
+
+    >>> space = get_canonical_space()
+    >>> space.state_id(["X"] + [" "] * 8) == space.state_id([" "] * 8 + ["O"])
+    True
+    >>> get_state_space().n_states // space.n_states >= 10
+    True
+    """
+    space = get_state_space()
+    canonical = get_canonical_codes()
+    representatives = np.flatnonzero(canonical[space.codes] == space.codes)
+    codes = space.codes[representatives]
+
+    canonical_id = np.full(N_CODES, NO_STATE, dtype=np.int32)
+    canonical_id[codes] = np.arange(len(codes), dtype=np.int32)
+    index = np.full(N_CODES, NO_STATE, dtype=np.int32)
+    index[space.codes] = canonical_id[canonical[space.codes]]
+
+    full_successors = space.successors[representatives]
+    successors = np.where(
+        full_successors != NO_STATE,
+        index[space.codes[np.maximum(full_successors, 0)]],
+        NO_STATE,
+    ).astype(np.int32)
+
+    depth = space.depth[representatives]
+    # Representatives keep the breadth-first order, so they are still grouped by depth
+    layer_offsets = np.searchsorted(depth, np.arange(len(space.layer_offsets)), side="left")
+
+    reduced = StateSpace(
+        codes=codes,
+        index=index,
+        depth=depth,
+        layer_offsets=layer_offsets.astype(np.int32),
+        terminal=space.terminal[representatives],
+        won=space.won[representatives],
+        successors=successors,
+        rewards=space.rewards[representatives],
+    )
+    for array in reduced:
+        array.flags.writeable = False
+    return reduced
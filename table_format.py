@@ -0,0 +1,164 @@
+"""
+Binary file format for ValueTables that is loaded with numpy.memmap.
+
+A file is a 64 byte header followed by the raw table array:
+
+    magic      8s   b"WTTTABLE"
+    version    u16  FORMAT_VERSION
+    dtype      u8   0 = float32, 1 = int8 (see ValueTable)
+    encoding   u8   how boards map to array indices (ENCODING_BASE3_3X3)
+    n_entries  u64  length of the array
+    checksum   u32  zlib.crc32 of the array bytes
+    padding         zeros up to HEADER_SIZE
+
+Loading maps the file instead of reading it, so every process that loads
+the same table shares one copy in the page cache and startup time does not
+grow with the size of the table.
+
+Convert an existing pickle with:  python table_format.py dict_TEAM.pkl
+"""
+import argparse
+import os
+import pickle
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from state_space import N_CODES
+from value_table import ValueTable
+
+MAGIC = b"WTTTABLE"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+# Position i of the flat board is base-3 digit i: EMPTY = 0, X = 1, O = 2
+ENCODING_BASE3_3X3 = 1
+FILE_EXTENSION = ".wttt"
+
+_HEADER = struct.Struct("<8sHBBQI")
+_DTYPE_CODES = {np.dtype(np.float32): 0, np.dtype(np.int8): 1}
+_CODE_DTYPES = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+
+
+class TableFormatError(ValueError):
+    pass
+
+
+def save_table(table: ValueTable, path: str) -> None:
+    """Writes table to path. The file is replaced atomically."""
+    data = np.ascontiguousarray(table.table)
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        _DTYPE_CODES[data.dtype],
+        ENCODING_BASE3_3X3,
+        len(data),
+        zlib.crc32(data.tobytes()),
+    )
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(data.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _read_header(path: str):
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise TableFormatError(f"{path} is too short to be a table file")
+    magic, version, dtype_code, encoding, n_entries, checksum = _HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise TableFormatError(f"{path} is not a table file")
+    if version != FORMAT_VERSION:
+        raise TableFormatError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+    if encoding != ENCODING_BASE3_3X3 or n_entries != N_CODES:
+        raise TableFormatError(f"{path} uses state encoding {encoding} with {n_entries} entries")
+    if dtype_code not in _CODE_DTYPES:
+        raise TableFormatError(f"{path} has unknown dtype code {dtype_code}")
+    return _CODE_DTYPES[dtype_code], n_entries, checksum
+
+
+def load_table(path: str, verify_checksum: bool = False) -> ValueTable:
+    """
+    Memory-maps a table file read-only.
+
+    verify_checksum reads the whole table to check it against the header,
+    which makes loading cost proportional to the table size again.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "dict_TEST.wttt")
+    >>> board = ("X", " ", " ", " ", "O", " ", " ", " ", " ")
+    >>> for dtype in (np.float32, np.int8):
+    ...     save_table(ValueTable({board: -1.0}, dtype=dtype), path)
+    ...     table = load_table(path, verify_checksum=True)
+    ...     print(table.dtype, table[board], len(table))
+    float32 -1.0 1
+    int8 -1.0 1
+
+    Files with a bad header are refused, and a corrupted table fails its
+    checksum when it is verified:
+
+    >>> def corrupt(offset, data):
+    ...     save_table(ValueTable({board: 0.5}), path)
+    ...     with open(path, "r+b") as f:
+    ...         _ = f.seek(offset)
+    ...         _ = f.write(data)
+    >>> for offset, data in [(0, b"NOTTABLE"), (8, bytes([9, 0])), (11, bytes([7])), (-4, b"?")]:
+    ...     corrupt(offset if offset >= 0 else os.path.getsize(path) + offset, data)
+    ...     try:
+    ...         load_table(path, verify_checksum=True)
+    ...     except TableFormatError as error:
+    ...         print(str(error).replace(path, "PATH"))
+    PATH is not a table file
+    PATH has format version 9, expected 1
+    PATH uses state encoding 7 with 19683 entries
+    PATH failed its checksum
+    >>> with open(path, "wb") as f:
+    ...     _ = f.write(MAGIC)
+    >>> try:
+    ...     load_table(path)
+    ... except TableFormatError as error:
+    ...     print(str(error).replace(path, "PATH"))
+    PATH is too short to be a table file
+    """
+    dtype, n_entries, checksum = _read_header(path)
+    array = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(n_entries,))
+    if verify_checksum and zlib.crc32(array.tobytes()) != checksum:
+        raise TableFormatError(f"{path} failed its checksum")
+    return ValueTable.from_array(array)
+
+
+def convert_pickle(
+    pickle_path: str, table_path: Optional[str] = None, dtype=np.float32
+) -> str:
+    """
+    Converts a pickled value function (dict or ValueTable) to a table file.
+
+    Returns the path written, which defaults to pickle_path with a .wttt extension.
+
+    >>> import tempfile
+    >>> pickle_path = os.path.join(tempfile.mkdtemp(), "dict_TEST.pkl")
+    >>> with open(pickle_path, "wb") as f:
+    ...     pickle.dump({(" ",) * 9: -0.25}, f)
+    >>> table_path = convert_pickle(pickle_path)
+    >>> os.path.basename(table_path), load_table(table_path)[(" ",) * 9]
+    ('dict_TEST.wttt', -0.25)
+    """
+    with open(pickle_path, "rb") as f:
+        values = pickle.load(f)
+    table_path = table_path or os.path.splitext(pickle_path)[0] + FILE_EXTENSION
+    save_table(ValueTable(values, dtype=dtype), table_path)
+    load_table(table_path, verify_checksum=True)
+    return table_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled value functions to table files")
+    parser.add_argument("pickles", nargs="+", help="dict_TEAM.pkl files to convert")
+    parser.add_argument("--int8", action="store_true", help="quantize values to int8")
+    args = parser.parse_args()
+    for pickle_path in args.pickles:
+        table_path = convert_pickle(pickle_path, dtype=np.int8 if args.int8 else np.float32)
+        print(f"{pickle_path} -> {table_path}")
@@ -0,0 +1,410 @@
+"""
+Training loops that work on the dense state ids from state_space.py.
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import Telemetry
+from state_space import NO_STATE, StateSpace, get_state_space
+
+
+class _SweepTables(NamedTuple):
+    legal: np.ndarray
+    next_states: np.ndarray
+    rewards: np.ndarray
+    to_update: np.ndarray
+
+
+def _sweep_tables(space: StateSpace, step_penalty: float) -> _SweepTables:
+    """The per-state arrays a sweep needs, with illegal moves pointing at state 0."""
+    legal = space.successors != NO_STATE
+    next_states = np.where(legal, space.successors, 0)
+    ongoing = legal & ~space.terminal[next_states]
+    rewards = np.where(ongoing, step_penalty, space.rewards).astype(np.float32)
+    return _SweepTables(legal, next_states, rewards, ~space.terminal)
+
+
+def value_iteration(
+    space: StateSpace = None,
+    step_penalty: float = -0.04,
+    threshold: float = 0.001,
+    telemetry: Optional[Telemetry] = None,
+) -> np.ndarray:
+    """
+    Sweeps every non-terminal state until the largest change is below threshold.
+
+    The value of a state is the best reward + next value over its legal moves,
+    where a move's reward is 1 if it wins, 0 if it draws and step_penalty
+    otherwise. Terminal states are worth 0.
+
+    Returns a (n_states,) array of values indexed by state id. If telemetry
+    is given, a "sweep" event is emitted after every sweep.
+    """
+    space = space or get_state_space()
+    legal, next_states, rewards, to_update = _sweep_tables(space, step_penalty)
+    n_updated = int(to_update.sum())
+
+    values = np.zeros(space.n_states, dtype=np.float32)
+    delta = np.inf
+    sweep = 0
+    while delta > threshold:
+        start = time.perf_counter()
+        action_values = np.where(legal, rewards + values[next_states], -np.inf)
+        new_values = np.where(to_update, action_values.max(axis=1), 0.0)
+        delta = float(np.abs(new_values - values).max())
+        values = new_values.astype(np.float32)
+        sweep += 1
+        if telemetry is not None:
+            seconds = time.perf_counter() - start
+            telemetry.count("training.sweeps")
+            telemetry.count("training.states_visited", n_updated)
+            telemetry.add_time("training.sweep", seconds)
+            telemetry.emit(
+                "sweep",
+                sweep=sweep,
+                delta=delta,
+                states_visited=n_updated,
+                states_skipped=space.n_states - n_updated,
+                seconds=seconds,
+            )
+    return values
+
+
+class CheckpointError(ValueError):
+    pass
+
+
+class Checkpoint(NamedTuple):
+    """
+    The state of resumable_value_iteration() between two sweeps.
+
+    values:        (n_states,) float32 values indexed by state id
+    dirty:         (n_states,) bool, True for the states the next sweep recomputes
+    sweep:         number of sweeps done so far
+    delta:         largest change in the last sweep
+    step_penalty:  reward of a move that does not end the game
+    """
+
+    values: np.ndarray
+    dirty: np.ndarray
+    sweep: int
+    delta: float
+    step_penalty: float
+
+
+def save_checkpoint(checkpoint: Checkpoint, path: str) -> None:
+    """Writes checkpoint to path as a .npz file. The file is replaced atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **checkpoint._asdict())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    """Loads a checkpoint written by save_checkpoint(), or returns None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        return Checkpoint(
+            values=arrays["values"],
+            dirty=arrays["dirty"],
+            sweep=int(arrays["sweep"]),
+            delta=float(arrays["delta"]),
+            step_penalty=float(arrays["step_penalty"]),
+        )
+
+
+def _predecessors(space: StateSpace) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The states with a move into each state, as (offsets, parents): the
+    parents of state s are parents[offsets[s]:offsets[s + 1]].
+    """
+    legal = space.successors != NO_STATE
+    parents = np.repeat(np.arange(space.n_states), legal.sum(axis=1))
+    children = space.successors[legal]
+    order = np.argsort(children, kind="stable")
+    offsets = np.zeros(space.n_states + 1, dtype=np.int64)
+    np.cumsum(np.bincount(children, minlength=space.n_states), out=offsets[1:])
+    return offsets, parents[order]
+
+
+def resumable_value_iteration(
+    space: StateSpace = None,
+    step_penalty: float = -0.04,
+    threshold: float = 0.001,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_every: int = 1,
+    initial_values: Optional[np.ndarray] = None,
+    max_sweeps: Optional[int] = None,
+    telemetry: Optional[Telemetry] = None,
+) -> np.ndarray:
+    """
+    value_iteration() that can be stopped and resumed, and warm started.
+
+    Each sweep only recomputes the states on a worklist: those with a
+    successor whose value changed in the sweep before. The other states
+    would get the same value again, so the values after every sweep, and
+    the result, are exactly those of value_iteration().
+
+    With a checkpoint_path, the values and worklist are saved there every
+    checkpoint_every sweeps and when the run stops, and a run started
+    with a checkpoint already at checkpoint_path carries on from it.
+    max_sweeps stops the run early (to be resumed later) after that many
+    sweeps in total.
+
+    Without a checkpoint to resume, initial_values (indexed by state id,
+    e.g. the result of an earlier run with other rewards) seed the
+    values. The first sweep then finds the states whose values do not
+    hold any more, and only the positions leading to them are swept
+    again, instead of every state for as many sweeps as a cold start.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "checkpoint.npz")
+    >>> values = value_iteration()
+    >>> stopped = resumable_value_iteration(checkpoint_path=path, max_sweeps=3)
+    >>> load_checkpoint(path).sweep
+    3
+    >>> np.array_equal(resumable_value_iteration(checkpoint_path=path), values)
+    True
+    >>> cold, warm = Telemetry(), Telemetry()
+    >>> _ = resumable_value_iteration(step_penalty=-0.05, telemetry=cold)
+    >>> changed = resumable_value_iteration(
+    ...     step_penalty=-0.05, initial_values=values, telemetry=warm
+    ... )
+    >>> np.array_equal(changed, value_iteration(step_penalty=-0.05))
+    True
+    >>> warm.counters["training.states_visited"] < cold.counters["training.states_visited"]
+    True
+    """
+    space = space or get_state_space()
+    legal, next_states, rewards, to_update = _sweep_tables(space, step_penalty)
+    offsets, parents = _predecessors(space)
+
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint is not None:
+        if len(checkpoint.values) != space.n_states:
+            raise CheckpointError(
+                f"{checkpoint_path} has {len(checkpoint.values)} states, expected {space.n_states}"
+            )
+        if checkpoint.step_penalty != step_penalty:
+            raise CheckpointError(
+                f"{checkpoint_path} was made with step_penalty {checkpoint.step_penalty}, "
+                f"not {step_penalty}"
+            )
+        values = checkpoint.values.astype(np.float32)
+        dirty = checkpoint.dirty.copy()
+        sweep, delta = checkpoint.sweep, checkpoint.delta
+    else:
+        values = np.zeros(space.n_states, dtype=np.float32)
+        if initial_values is not None:
+            values[to_update] = np.asarray(initial_values, dtype=np.float32)[to_update]
+        dirty = to_update.copy()
+        sweep, delta = 0, np.inf
+
+    def save() -> None:
+        if checkpoint_path:
+            save_checkpoint(Checkpoint(values, dirty, sweep, delta, step_penalty), checkpoint_path)
+
+    while delta > threshold and (max_sweeps is None or sweep < max_sweeps):
+        start = time.perf_counter()
+        worklist = np.flatnonzero(dirty)
+        action_values = np.where(
+            legal[worklist], rewards[worklist] + values[next_states[worklist]], -np.inf
+        )
+        new_values = action_values.max(axis=1).astype(np.float32)
+        changes = new_values != values[worklist]
+        delta = float(np.abs(new_values - values[worklist]).max()) if len(worklist) else 0.0
+        values[worklist] = new_values
+
+        # Only the parents of a state that changed can change in the next sweep
+        changed = worklist[changes]
+        starts, counts = offsets[changed], offsets[changed + 1] - offsets[changed]
+        edges = np.arange(counts.sum()) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+        dirty[:] = False
+        dirty[parents[edges]] = True
+        dirty &= to_update
+        sweep += 1
+
+        if telemetry is not None:
+            seconds = time.perf_counter() - start
+            telemetry.count("training.sweeps")
+            telemetry.count("training.states_visited", len(worklist))
+            telemetry.add_time("training.sweep", seconds)
+            telemetry.emit(
+                "sweep",
+                sweep=sweep,
+                delta=delta,
+                states_visited=len(worklist),
+                states_skipped=space.n_states - len(worklist),
+                seconds=seconds,
+            )
+        if sweep % checkpoint_every == 0:
+            save()
+    save()
+    return values
+
+
+# Set in each worker when the pool starts: the sweep tables, the blocks of
+# state ids to sweep, and the value buffers in shared memory
+_worker_tables: Optional[_SweepTables] = None
+_worker_buffers: List[np.ndarray] = []
+_worker_memory: List[SharedMemory] = []
+
+
+def _init_sweep_worker(tables: _SweepTables, names: List[str], n_states: int) -> None:
+    global _worker_tables, _worker_buffers, _worker_memory
+    _worker_tables = tables
+    _worker_memory = [SharedMemory(name=name) for name in names]
+    _worker_buffers = [
+        np.ndarray((n_states,), dtype=np.float32, buffer=memory.buf) for memory in _worker_memory
+    ]
+
+
+def _sweep_shard(task: Tuple[List[Tuple[int, int]], int, int]) -> float:
+    """
+    Sweeps one shard, reading values from one buffer and writing them to another.
+
+    The shard is a list of (start, end) blocks of state ids, deepest first.
+    When both buffers are the same the update is in place (Gauss-Seidel), so
+    each block already sees the new values of the deeper blocks before it.
+    Returns the largest change in value.
+    """
+    blocks, read, write = task
+    legal, next_states, rewards, to_update = _worker_tables
+    old_values, new_values = _worker_buffers[read], _worker_buffers[write]
+    delta = 0.0
+    for start, end in blocks:
+        rows = slice(start, end)
+        next_values = rewards[rows] + old_values[next_states[rows]]
+        action_values = np.where(legal[rows], next_values, -np.inf)
+        values = np.where(to_update[rows], action_values.max(axis=1), 0.0)
+        delta = max(delta, float(np.abs(values - old_values[rows]).max()))
+        new_values[rows] = values
+    return delta
+
+
+def _shards(space: StateSpace, n_shards: int) -> List[List[Tuple[int, int]]]:
+    """Splits the state ids into n_shards ranges, each cut into blocks at the depth layers."""
+    bounds = np.linspace(0, space.n_states, n_shards + 1).astype(int)
+    shards = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        cuts = [start] + [c for c in space.layer_offsets if start < c < end] + [end]
+        blocks = [(int(a), int(b)) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+        shards.append(blocks[::-1])
+    return [shard for shard in shards if shard]
+
+
+def parallel_value_iteration(
+    space: StateSpace = None,
+    step_penalty: float = -0.04,
+    threshold: float = 0.001,
+    processes: Optional[int] = None,
+    gauss_seidel: bool = False,
+    telemetry: Optional[Telemetry] = None,
+) -> np.ndarray:
+    """
+    value_iteration() with the sweeps split across a pool of processes.
+
+    The values live in shared memory and the state ids are split into
+    contiguous ranges, one task per range, so each sweep is one pool.map()
+    whose per-shard deltas are reduced with max(). By default a sweep reads
+    the previous sweep's values and writes a second buffer, giving exactly
+    the same values as value_iteration(). With gauss_seidel=True values are
+    updated in place, deepest layers first, which needs far fewer sweeps
+    but depends on the order the shards run in.
+
+    The 3x3 state space is solved serially in tens of milliseconds, so
+    starting the pool and dispatching each sweep can cost more than the
+    sweeps it splits. `python benchmarks.py run --only parallel` times both
+    versions for 1, 2 and 4 processes; check it on the target machine before
+    choosing this over value_iteration().
+
+    >>> import numpy as np
+    >>> expected = value_iteration()
+    >>> bool(np.allclose(parallel_value_iteration(processes=2), expected))
+    True
+    >>> bool(np.allclose(parallel_value_iteration(processes=2, gauss_seidel=True), expected,
+    ...                  atol=0.01))
+    True
+    """
+    space = space or get_state_space()
+    tables = _sweep_tables(space, step_penalty)
+    n_updated = int(tables.to_update.sum())
+    processes = processes or os.cpu_count() or 1
+    # A few shards per process keeps every process busy when shards take uneven time
+    shards = _shards(space, 1 if processes == 1 else processes * 4)
+
+    n_buffers = 1 if gauss_seidel else 2
+    nbytes = space.n_states * np.dtype(np.float32).itemsize
+    memory = [SharedMemory(create=True, size=nbytes) for _ in range(n_buffers)]
+    try:
+        names = [block.name for block in memory]
+        for block in memory:
+            np.ndarray((space.n_states,), dtype=np.float32, buffer=block.buf)[:] = 0.0
+        if processes == 1:
+            _init_sweep_worker(tables, names, space.n_states)
+            pool = None
+            sweep_map = map
+        else:
+            pool = multiprocessing.Pool(
+                processes, initializer=_init_sweep_worker, initargs=(tables, names, space.n_states)
+            )
+            sweep_map = pool.map
+        try:
+            read, write = 0, n_buffers - 1
+            delta = np.inf
+            sweep = 0
+            while delta > threshold:
+                start = time.perf_counter()
+                delta = max(sweep_map(_sweep_shard, [(shard, read, write) for shard in shards]))
+                read, write = write, read
+                sweep += 1
+                if telemetry is not None:
+                    seconds = time.perf_counter() - start
+                    telemetry.count("training.sweeps")
+                    telemetry.count("training.states_visited", n_updated)
+                    telemetry.add_time("training.sweep", seconds)
+                    telemetry.emit(
+                        "sweep",
+                        sweep=sweep,
+                        delta=delta,
+                        states_visited=n_updated,
+                        states_skipped=space.n_states - n_updated,
+                        seconds=seconds,
+                        processes=processes,
+                        shards=len(shards),
+                    )
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        # After the swap, read is the buffer the last sweep wrote
+        values = np.ndarray((space.n_states,), dtype=np.float32, buffer=memory[read].buf).copy()
+    finally:
+        _release_worker_memory()
+        for block in memory:
+            block.close()
+            block.unlink()
+    return values
+
+
+def _release_worker_memory() -> None:
+    global _worker_buffers, _worker_memory
+    # Views into a shared memory block must go before the block can be closed
+    _worker_buffers = []
+    for block in _worker_memory:
+        block.close()
+    _worker_memory = []
+
+
+def values_by_board(values: np.ndarray, space: StateSpace = None) -> Dict:
+    """Converts an array of values indexed by state id into a dict keyed by tuple(board)."""
+    space = space or get_state_space()
+    return {tuple(space.board(state)): float(value) for state, value in enumerate(values)}
@@ -0,0 +1,124 @@
+"""
+A compact value function: a NumPy array with one entry per base-3 board code.
+
+ValueTable is a MutableMapping keyed by tuple(board), like the dicts returned
+by train(), so it works with choose_move(), save_dictionary() and
+load_dictionary(). Unlike a defaultdict, reading a missing board never
+inserts it. With float32 storage the whole table is 77KB, with int8 19KB.
+"""
+from collections.abc import Mapping, MutableMapping
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from state_space import N_CODES, StateSpace, decode, encode
+
+# int8 tables store round(value * INT8_SCALE), so values must lie in [-1, 1]
+INT8_SCALE = 127
+_INT8_MISSING = np.iinfo(np.int8).min
+
+
+class ValueTable(MutableMapping):
+    """
+    Value function stored as a (3**9,) array indexed by board code.
+
+    >>> table = ValueTable({("X", "X", " ", " ", " ", " ", " ", " ", " "): 0.5})
+    >>> table[("X", "X", " ", " ", " ", " ", " ", " ", " ")]
+    0.5
+    >>> table.get(tuple(" " * 9), 0.0), len(table)
+    (0.0, 1)
+    >>> ValueTable(table, dtype=np.int8).nbytes
+    19683
+    """
+
+    def __init__(self, values: Optional[Mapping] = None, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        assert self.dtype in (np.float32, np.int8), f"Unsupported dtype {self.dtype}"
+        self.table = np.full(N_CODES, self._missing, dtype=self.dtype)
+        if values is not None:
+            for board, value in values.items():
+                self[board] = value
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "ValueTable":
+        """Wraps an existing (3**9,) array, e.g. a read-only numpy.memmap, without copying it."""
+        assert array.shape == (N_CODES,), f"Expected {N_CODES} entries, got {array.shape}"
+        table = cls.__new__(cls)
+        table.dtype = array.dtype
+        table.table = array
+        return table
+
+    @classmethod
+    def from_states(
+        cls, values: np.ndarray, space: StateSpace, dtype=np.float32
+    ) -> "ValueTable":
+        """Builds a table from an array of values indexed by the state ids of space."""
+        table = cls(dtype=dtype)
+        table.table[space.codes] = table._store(np.asarray(values))
+        return table
+
+    @property
+    def _missing(self):
+        return _INT8_MISSING if self.dtype == np.int8 else np.nan
+
+    def _store(self, values: np.ndarray) -> np.ndarray:
+        if self.dtype == np.int8:
+            return np.round(np.clip(values, -1.0, 1.0) * INT8_SCALE).astype(np.int8)
+        return values.astype(np.float32)
+
+    def _is_missing(self, raw) -> np.ndarray:
+        if self.dtype == np.int8:
+            return raw == _INT8_MISSING
+        return np.isnan(raw)
+
+    def get_code(self, code: int, default: Optional[float] = None) -> Optional[float]:
+        """Value of a board given its base-3 code."""
+        raw = self.table[code]
+        if self._is_missing(raw):
+            return default
+        return float(raw) / INT8_SCALE if self.dtype == np.int8 else float(raw)
+
+    def get_codes(self, codes: np.ndarray, default: float = 0.0) -> np.ndarray:
+        """Float32 values of an array of board codes, default where missing."""
+        raw = self.table[codes]
+        values = raw.astype(np.float32)
+        if self.dtype == np.int8:
+            values /= INT8_SCALE
+        values[self._is_missing(raw)] = default
+        return values
+
+    def __getitem__(self, board: Sequence[str]) -> float:
+        value = self.get_code(encode(board))
+        if value is None:
+            raise KeyError(board)
+        return value
+
+    def __setitem__(self, board: Sequence[str], value: float) -> None:
+        self.table[encode(board)] = self._store(np.asarray(value))
+
+    def __delitem__(self, board: Sequence[str]) -> None:
+        code = encode(board)
+        if self._is_missing(self.table[code]):
+            raise KeyError(board)
+        self.table[code] = self._missing
+
+    def __contains__(self, board) -> bool:
+        return not self._is_missing(self.table[encode(board)])
+
+    def codes(self) -> np.ndarray:
+        """Codes of every board in the table."""
+        return np.flatnonzero(~self._is_missing(self.table))
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        for code in self.codes():
+            yield tuple(decode(int(code)))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(~self._is_missing(self.table)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def __repr__(self) -> str:
+        return f"ValueTable({len(self)} boards, dtype={self.dtype}, {self.nbytes / 1024:.0f}KB)"